@@ -114,7 +114,9 @@ export function useTaskManager(department) {
         url: 'planner.api.batch_update_tasks',
         params: { updates },
         onSuccess: (data) => {
+          const failed = new Set((data?.failed || []).map(f => f.task_id))
           updates.forEach(update => {
+            if (failed.has(update.task_id)) return
             const index = tasks.value.findIndex(t => t.name === update.task_id)
             if (index !== -1) {
               tasks.value[index] = {
@@ -123,6 +125,10 @@ export function useTaskManager(department) {
               }
             }
           })
+          if (failed.size) {
+            error.value = data.failed
+            console.error('Some tasks could not be updated:', data.failed)
+          }
           saveToCache()
         },
         onError: (err) => {
@@ -1,6 +1,7 @@
-import { ref, computed, watch, nextTick } from 'vue'
+import { ref, computed, watch, nextTick, onScopeDispose } from 'vue'
 import { createResource } from 'frappe-ui'
 import { useErrorHandler } from '@/services/errorHandler'
+import { getSocket } from '@/socket'
 
 export function useWorkloadManager(initialDepartment) {
   // Core state
@@ -10,6 +11,9 @@ export function useWorkloadManager(initialDepartment) {
   const loading = ref(false)
   const error = ref(null)
   const lastUpdate = ref(null)
+  // ETag of the workload payload currently shown; the server answers with an
+  // empty message while it still matches
+  const workloadEtag = ref(null)
 
   const { addError } = useErrorHandler()
 
@@ -83,8 +87,53 @@ export function useWorkloadManager(initialDepartment) {
     })
   })
 
+  // Decode the compact columnar payload (planner.columnar.encode_tasks) into task objects
+  const decodeColumnarTasks = (payload) => {
+    const { columns, dictionaries, people = {} } = payload
+    const origin = payload.origin ? new Date(`${payload.origin}T00:00:00Z`) : null
+    const offsetToDate = (offset) => {
+      if (offset === null || offset === undefined || !origin) return null
+      const date = new Date(origin)
+      date.setUTCDate(date.getUTCDate() + offset)
+      return date.toISOString().slice(0, 10)
+    }
+
+    const decoded = new Array(payload.count)
+    for (let i = 0; i < payload.count; i++) {
+      const startDate = offsetToDate(columns.startDate[i])
+      const endDate = offsetToDate(columns.endDate[i])
+      decoded[i] = {
+        id: columns.id[i],
+        title: columns.title[i],
+        project: dictionaries.project[columns.project[i]],
+        status: dictionaries.status[columns.status[i]],
+        priority: dictionaries.priority[columns.priority[i]],
+        assignee: dictionaries.assignee[columns.assignee[i]],
+        startDate,
+        endDate,
+        duration: columns.duration[i],
+        color: dictionaries.color[columns.color[i]],
+        type: dictionaries.type[columns.type[i]],
+        description: columns.description[i],
+        isScheduled: !!(startDate && endDate),
+        isOverdue: !!columns.isOverdue[i],
+        assignees: columns.assignees[i].map(code => {
+          const id = dictionaries.assignee[code]
+          return { id, ...(people[id] || {}) }
+        }),
+        comments_count: columns.comments_count[i],
+        created: columns.created[i],
+        modified: columns.modified[i]
+      }
+    }
+    return decoded
+  }
+
   // Data processing functions
 const processTaskData = (rawTasks) => {
+  if (rawTasks && rawTasks.format === 'columnar') {
+    rawTasks = decodeColumnarTasks(rawTasks)
+  }
   if (!Array.isArray(rawTasks)) {
     console.error("Invalid tasks data received:", rawTasks)
     return []
@@ -132,7 +181,9 @@ const processTaskData = (rawTasks) => {
         status: task.status || "Open",
         priority: task.priority || "Medium",
         color: task.color || "#6B7280",
-        description: task.description || ""
+        description: task.description || "",
+        // Version sent back with moves so concurrent edits are detected
+        modified: task.modified || null
       }
     })
   }
@@ -195,11 +246,20 @@ const processAssigneeData = (rawAssignees) => {
         params: { 
           department: department.value,
           start_date: formatDateForAPI(startDate),
-          end_date: formatDateForAPI(endDate)
+          end_date: formatDateForAPI(endDate),
+          compact: 1,
+          etag: workloadEtag.value
         },
         onSuccess: (data) => {
           console.log("API Response received:", data)
           
+          if (!data) {
+            // Not modified: the data on screen is current
+            lastUpdate.value = new Date()
+            return
+          }
+          workloadEtag.value = data.etag || null
+          
           // Process data
           tasks.value = processTaskData(data.tasks || [])
           assignees.value = processAssigneeData(data.assignees || [])
@@ -237,6 +297,8 @@ const processAssigneeData = (rawAssignees) => {
     loading.value = true
     error.value = null
 
+    const current = tasks.value.find(t => t.id === taskId)
+
     try {
       const resource = createResource({
         url: 'planner.api.move_task',
@@ -244,19 +306,21 @@ const processAssigneeData = (rawAssignees) => {
           task_id: taskId,
           assignee_id: assigneeId,
           start_date: formatDateForAPI(startDate),
-          end_date: formatDateForAPI(endDate)
+          end_date: formatDateForAPI(endDate),
+          modified: current?.modified
         },
-        onSuccess: () => {
-          // Update local task data
+        onSuccess: (result) => {
+          if (!result?.success) {
+            // Rejected or changed by someone else: show the server's version
+            error.value = result?.message || result?.error || 'Task could not be moved'
+            loadWorkloadData(null, null, true)
+            return
+          }
+
+          // Update local task data from the saved task
           const taskIndex = tasks.value.findIndex(t => t.id === taskId)
-          if (taskIndex !== -1) {
-            tasks.value[taskIndex] = {
-              ...tasks.value[taskIndex],
-              assignee: assigneeId,
-              startDate: parseDate(startDate),
-              endDate: parseDate(endDate),
-              isScheduled: !!(startDate && endDate)
-            }
+          if (taskIndex !== -1 && result.task) {
+            tasks.value[taskIndex] = processTaskData([result.task])[0]
           }
           
           // Recalculate utilizations
@@ -268,8 +332,63 @@ const processAssigneeData = (rawAssignees) => {
           saveToCache()
         },
         onError: (err) => {
+          // Includes 409 Conflict when the task changed since it was loaded
           error.value = err
           console.error('Error moving task:', err)
+          loadWorkloadData(null, null, true)
+        }
+      })
+
+      await resource.submit()
+    } finally {
+      loading.value = false
+    }
+  }
+
+  // Move several tasks at once (drag-select); applied all or nothing
+  const moveTasks = async (moves) => {
+    loading.value = true
+    error.value = null
+
+    try {
+      const resource = createResource({
+        url: 'planner.api.move_tasks',
+        params: {
+          moves: moves.map(move => ({
+            task_id: move.taskId,
+            assignee_id: move.assigneeId,
+            start_date: formatDateForAPI(move.startDate),
+            end_date: formatDateForAPI(move.endDate),
+            modified: move.modified || tasks.value.find(t => t.id === move.taskId)?.modified
+          }))
+        },
+        onSuccess: (result) => {
+          if (!result?.success) {
+            error.value = result?.errors || result?.error || 'Some tasks could not be moved'
+            return
+          }
+
+          // Apply the saved tasks; fields a move omitted are kept by the server
+          processTaskData(result.tasks || []).forEach(saved => {
+            const taskIndex = tasks.value.findIndex(t => t.id === saved.id)
+            if (taskIndex !== -1) {
+              tasks.value[taskIndex] = saved
+            }
+          })
+          
+          // Recalculate utilizations
+          assignees.value = assignees.value.map(a => ({
+            ...a,
+            utilization: calculateUtilization(a.id)
+          }))
+          
+          saveToCache()
+        },
+        onError: (err) => {
+          // Includes 409 Conflict when a task changed since it was loaded
+          error.value = err
+          console.error('Error moving tasks:', err)
+          loadWorkloadData(null, null, true)
         }
       })
 
@@ -405,6 +524,7 @@ const processAssigneeData = (rawAssignees) => {
   }
 
   const clearCache = () => {
+    workloadEtag.value = null
     try {
       localStorage.removeItem(getCacheKey(department.value))
     } catch (e) {
@@ -412,6 +532,58 @@ const processAssigneeData = (rawAssignees) => {
     }
   }
 
+  // Live updates: the server publishes batch_task_update to the department
+  // room (and to the acting user); tasks are patched in place by id
+  const socket = getSocket()
+
+  const subscribeDepartment = (newDept, oldDept) => {
+    if (oldDept) socket.emit('doc_unsubscribe', 'Department', oldDept)
+    if (newDept) socket.emit('doc_subscribe', 'Department', newDept)
+  }
+
+  const applyRealtimeUpdates = ({ updates = [] } = {}) => {
+    let changed = false
+    for (const update of updates) {
+      if (!update.task) continue
+
+      const index = tasks.value.findIndex(t => t.id === update.task_id)
+      const current = index === -1 ? null : tasks.value[index]
+      // Versions are server timestamps in one format, so they compare as strings;
+      // anything not newer than the copy shown (e.g. our own move) is skipped
+      if (current && current.modified && String(update.version) <= String(current.modified)) continue
+
+      const leftDepartment = department.value && update.department !== department.value
+      if (leftDepartment) {
+        if (index !== -1) {
+          tasks.value.splice(index, 1)
+          changed = true
+        }
+        continue
+      }
+
+      const [incoming] = processTaskData([update.task])
+      if (index === -1) {
+        tasks.value.push(incoming)
+      } else {
+        tasks.value[index] = incoming
+      }
+      changed = true
+    }
+
+    if (changed) {
+      // The shown data no longer matches the cached payload's ETag
+      workloadEtag.value = null
+      lastUpdate.value = new Date()
+      saveToCache()
+    }
+  }
+
+  socket.on('batch_task_update', applyRealtimeUpdates)
+  onScopeDispose(() => {
+    socket.off('batch_task_update', applyRealtimeUpdates)
+    subscribeDepartment(null, department.value)
+  })
+
   // Initialize data loading
   const init = async () => {
     console.log("Initializing workload manager for department:", department.value)
@@ -425,6 +597,9 @@ const processAssigneeData = (rawAssignees) => {
 
   // Watch department changes
   watch(department, (newDept, oldDept) => {
+    if (newDept !== oldDept) {
+      subscribeDepartment(newDept, oldDept)
+    }
     if (newDept && newDept !== oldDept) {
       console.log("Department changed, reloading data:", newDept)
       clearCache()
@@ -449,6 +624,7 @@ const processAssigneeData = (rawAssignees) => {
     // Methods
     loadWorkloadData,
     moveTask,
+    moveTasks,
     updateTask,
     clearCache,
     
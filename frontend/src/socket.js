@@ -0,0 +1,20 @@
+import { io } from 'socket.io-client'
+
+let socket = null
+
+// One socket.io connection to the site's realtime server, shared by the app
+export function getSocket() {
+  if (socket) return socket
+
+  const host = window.location.hostname
+  const siteName = window.site_name || host
+  // Behind the bench dev server the socket.io server has its own port
+  const port = window.location.port ? `:${window.socketio_port || 9000}` : ''
+  const protocol = port ? 'http' : window.location.protocol.replace(':', '')
+
+  socket = io(`${protocol}://${host}${port}/${siteName}`, {
+    withCredentials: true,
+    reconnectionAttempts: 5,
+  })
+  return socket
+}
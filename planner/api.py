@@ -1,8 +1,13 @@
 from frappe import _
-from frappe.utils import now_datetime, get_datetime, getdate, add_days, date_diff
+from frappe.utils import now_datetime, cint
 from .realtime import emit_task_update, emit_batch_update
+from .cache import get_cached_workload_entry
+from .conditional import compute_etag, is_not_modified
+from .columnar import encode_tasks
 from planner.services.workload_service import WorkloadService
 from planner.services.task_service import TaskService
+from planner.services.schedule_service import ScheduleService
+from planner.services.workload_snapshot import WorkloadSnapshot
 import frappe
 import traceback
 
@@ -11,6 +16,22 @@ def oauth_providers():
     """Get OAuth providers for authentication (required by frappe-ui)"""
     return []
 
+@frappe.whitelist()
+def get_cache_generations(department=None, user=None):
+    """Inspect the current planner cache namespace generations (debugging)"""
+    frappe.only_for("System Manager")
+    from .cache import get_generations
+    
+    return get_generations(department=department or 'all', user=user)
+
+@frappe.whitelist()
+def get_cache_metrics():
+    """Inspect planner cache single-flight counters (debugging)"""
+    frappe.only_for("System Manager")
+    from .cache import get_cache_metrics as _get_cache_metrics
+    
+    return _get_cache_metrics()
+
 @frappe.whitelist()
 def verify_task_structure():
     """Verify Task doctype structure and required fields"""
@@ -114,8 +135,12 @@ def handle_api_error(e, error_title, fallback_data=None):
     return error_response
 
 @frappe.whitelist()
-def get_workload_data(department=None, start_date=None, end_date=None):
-    """Get workload data for ClickUp-style workload view"""
+def get_workload_data(department=None, start_date=None, end_date=None, compact=0):
+    """Get workload data for ClickUp-style workload view
+
+    With ``compact`` the tasks are sent in the columnar, dictionary-encoded
+    format built by ``planner.columnar.encode_tasks``.
+    """
     try:
         print("\n=== Workload Data Request ===")
         print(f"Department: {department}")
@@ -126,8 +151,14 @@ def get_workload_data(department=None, start_date=None, end_date=None):
         if not hasattr(WorkloadService, 'get_workload_data'):
             raise AttributeError("WorkloadService.get_workload_data method not found")
             
-        # Use WorkloadService for workload data
-        workload_data = WorkloadService.get_workload_data(department, start_date, end_date)
+        # Use the cached WorkloadService payload (refreshed in the background when stale)
+        workload_data, version = get_cached_workload_entry(department, start_date, end_date)
+        
+        # The ETag comes from the version of the cache entry actually served,
+        # so a match returns before the payload is encoded or serialized
+        etag = compute_etag(version, cint(compact))
+        if is_not_modified(etag):
+            return None
         
         # Ensure the response has the expected structure
         if not isinstance(workload_data, dict):
@@ -146,6 +177,13 @@ def get_workload_data(department=None, start_date=None, end_date=None):
         print(f"Total Assignees: {len(workload_data['assignees'])}")
         print(f"Total Tasks: {len(workload_data['tasks'])}")
         
+        # Copy so the cached payload keeps its task dicts
+        if cint(compact):
+            workload_data = {**workload_data, "tasks": encode_tasks(workload_data["tasks"], start_date)}
+        else:
+            workload_data = dict(workload_data)
+        
+        workload_data["etag"] = etag
         return workload_data
         
     except Exception as e:
@@ -173,6 +211,23 @@ def get_workload_data(department=None, start_date=None, end_date=None):
         
         return handle_api_error(e, "Workload Data Error", fallback_data)
 
+@frappe.whitelist()
+def get_workload_changes(department=None, since=None):
+    """Get tasks changed since a watermark, tombstones for removed tasks and a new watermark"""
+    try:
+        from .sync import get_workload_changes as _get_workload_changes
+        return _get_workload_changes(department, since)
+    except Exception as e:
+        return handle_api_error(e, "Workload Changes Error")
+
+@frappe.whitelist()
+def get_workload_matrix(department=None, start_date=None, end_date=None):
+    """Get per-day scheduled vs available hours for every employee of a department"""
+    try:
+        return WorkloadService.get_workload_matrix(department, start_date, end_date)
+    except Exception as e:
+        return handle_api_error(e, "Workload Matrix Error")
+
 @frappe.whitelist()
 def get_workload_data_safe(department=None, start_date=None, end_date=None):
     """Safe version of get_workload_data with fallback data"""
@@ -270,8 +325,11 @@ def get_fallback_workload_data(department=None):
                 limit=100
             )
             
+            user_map = TaskService.get_user_map(
+                user for task in task_list for user in TaskService.parse_assign(task)
+            )
             for task in task_list:
-                assignee = get_primary_assignee(task)
+                assignee = get_primary_assignee(task, user_map)
                 tasks.append({
                     "id": task.name,
                     "title": task.subject,
@@ -394,18 +452,17 @@ Created test task:
         )
 
 @frappe.whitelist()
-def list_tasks():
-    """List all tasks in the system with their details"""
+def list_tasks(cursor=None, page_size=None):
+    """List tasks in the system with their details, one keyset page at a time"""
     try:
-        # Get all tasks without any filters
-        tasks = frappe.get_all(
-            "Task",
-            fields=[
+        tasks, next_cursor = TaskService.fetch_task_page(
+            [
                 "name", "subject", "status", "priority", "project",
                 "exp_start_date", "exp_end_date", "expected_time",
                 "department", "_assign", "owner", "creation"
             ],
-            order_by="creation desc"
+            cursor=cursor,
+            page_size=page_size
         )
         
         formatted_tasks = []
@@ -432,16 +489,19 @@ def list_tasks():
                 print(f"Error formatting task {task.name}: {str(e)}")
                 continue
         
-        print(f"Found {len(tasks)} total tasks, {len(formatted_tasks)} formatted successfully")
+        # Counted with the first page only, as in routes/tasks.list_tasks
+        total_count = None if cursor else TaskService.count_tasks()
+        print(f"Found {total_count} total tasks, {len(formatted_tasks)} formatted successfully on this page")
         return {
-            "total_count": len(tasks),
-            "tasks": formatted_tasks
+            "total_count": total_count,
+            "tasks": formatted_tasks,
+            "next_cursor": next_cursor
         }
         
     except Exception as e:
         print(f"Error listing tasks: {str(e)}")
         frappe.log_error(frappe.get_traceback(), "List Tasks Error")
-        return {"error": str(e), "total_count": 0, "tasks": []}
+        return {"error": str(e), "total_count": 0, "tasks": [], "next_cursor": None}
 
 @frappe.whitelist()
 def get_planner_tasks(department=None):
@@ -450,60 +510,48 @@ def get_planner_tasks(department=None):
         workload_data = get_workload_data_safe(department)
         
         # Convert to legacy format for backward compatibility
-        employees_dict = {}
-        
-        for assignee in workload_data.get("assignees", []):
-            assignee_tasks = [task for task in workload_data.get("tasks", []) if task.get("assignee") == assignee["id"]]
-            
-            employees_dict[assignee["id"]] = {
-                "id": assignee["id"],
-                "name": assignee["name"],
-                "tasks": assignee_tasks
-            }
-        
-        return list(employees_dict.values())
+        return WorkloadSnapshot(workload_data).to_legacy_planner_tasks()
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Get Planner Tasks Error")
         return []
 
 @frappe.whitelist()
-def planner_get_backlog(searchtext=None, projectText=None):
-    """Get tasks for the backlog with enhanced search"""
+def planner_get_backlog(searchtext=None, projectText=None, start=0, page_length=None):
+    """Get tasks for the backlog, ranked by the full-text search and paginated"""
     print(f"\n=== Planner Backlog Request ===") 
     try:
-        filters = {
-            "_assign": ["is", "null"],
-        }
+        conditions = ["IFNULL(_assign, '') = ''"]
+        values = {}
         
-        if searchtext:
-            filters.update({
-                "subject": ["like", f"%{searchtext}%"]
-            })
-        
-        if projectText:
-            filters.update({
-                "project": ["like", f"%{projectText}%"]
-            })
+        search_conditions, search_values, score = TaskService.get_search_conditions(searchtext, projectText)
+        conditions.extend(search_conditions)
+        values.update(search_values)
         
-        tasks = frappe.get_all(
-            "Task",
-            filters=filters,
-            fields=[
+        tasks, has_more = TaskService.search_tasks(
+            [
                 "name", "subject", "status", "priority", "project",
                 "exp_start_date", "exp_end_date", "expected_time",
                 "department", "color", "_assign"
             ],
-            order_by="creation desc"
+            conditions,
+            values,
+            score=score,
+            start=start,
+            page_length=page_length
         )
         
         for task in tasks:
             task.color = get_task_color(task)
             #task.assigned_to = get_primary_assignee(task)
         
-        return tasks
+        return {
+            "tasks": tasks,
+            "has_more": has_more,
+            "next_start": cint(start) + len(tasks) if has_more else None
+        }
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Planner Backlog Error")
-        return []
+        return {"tasks": [], "has_more": False, "next_start": None}
 
 @frappe.whitelist()
 def update_task(task_id, updates):
@@ -545,21 +593,13 @@ def update_task(task_id, updates):
 def batch_update_tasks(updates):
     """Update multiple tasks in batch with real-time notifications"""
     try:
+        if isinstance(updates, str):
+            updates = frappe.parse_json(updates)
         if not updates:
             frappe.throw(_("No updates provided"))
         
-        # Use TaskService for batch update to ensure consistent formatting and error handling
-        if hasattr(TaskService, 'batch_update_tasks'):
-            updated_tasks = TaskService.batch_update_tasks(updates)
-        else:
-            # Fallback implementation
-            updated_tasks = []
-            for update in updates:
-                result = update_task(update.get('task_id'), update.get('updates', {}))
-                if 'error' not in result:
-                    updated_tasks.append(result)
-        
-        return updated_tasks
+        # One transaction for all rows; rows that fail validation are reported in "failed"
+        return TaskService.bulk_update_tasks(updates, user=frappe.session.user)
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Batch Update Tasks Error")
         return {"error": str(e)}
@@ -606,7 +646,7 @@ def get_task_assignees(task):
     
     return assignees
 
-def get_primary_assignee(task):
+def get_primary_assignee(task, user_map=None):
     """Get the primary assignee from _assign field"""
     try:
         if task._assign:
@@ -617,7 +657,10 @@ def get_primary_assignee(task):
             if assigned_users and len(assigned_users) > 0:
                 assignee = assigned_users[0]
                 # Verify if user exists
-                user_exists = frappe.db.exists("User", assignee)
+                if user_map is not None:
+                    user_exists = assignee in user_map
+                else:
+                    user_exists = frappe.db.exists("User", assignee)
                 if user_exists:
                     return assignee
                 else:
@@ -632,50 +675,117 @@ def get_primary_assignee(task):
     return "Unassigned"
 
 @frappe.whitelist()
-def move_task(task_id, assignee_id=None, start_date=None, end_date=None):
+def move_task(task_id, assignee_id=None, start_date=None, end_date=None, modified=None, allow_overlap=1):
     """Move task to different assignee or schedule"""
     try:
         if not task_id:
             frappe.throw(_("Task ID is required"))
         
-        task = frappe.get_doc("Task", task_id)
+        result = TaskService.move_task(
+            task_id,
+            assignee_id,
+            start_date,
+            end_date,
+            user=frappe.session.user,
+            modified=modified,
+            keep_missing_dates=True,
+            allow_overlap=cint(allow_overlap)
+        )
         
-        # Update assignment
-        if assignee_id:
-            if assignee_id == "unassigned":
-                task._assign = None
-            else:
-                # Get employee record to validate
-                employee = frappe.get_value("Employee", {"user_id": assignee_id}, "name")
-                if employee:
-                    task._assign = frappe.as_json([assignee_id])
-                else:
-                    frappe.throw(_("Invalid assignee"))
+        if result.get("conflict"):
+            frappe.local.response.http_status_code = 409
+        elif result.get("success"):
+            result["dependencies"] = propagate_dependencies([task_id])
         
-        # Update schedule
-        if start_date:
-            task.exp_start_date = getdate(start_date)
-        if end_date:
-            task.exp_end_date = getdate(end_date)
+        return result
         
-        try:
-            task.save(ignore_version=True)
-            frappe.db.commit()
-        except frappe.TimestampMismatchError:
-            # If timestamp mismatch, reload and retry
-            task.reload()
-            task.save(ignore_version=True)
-            frappe.db.commit()
+    except Exception as e:
+        frappe.logger().error(f"Error moving task: {str(e)}")
+        return handle_api_error(e, "Move Task Error")
+
+def propagate_dependencies(task_ids):
+    """Reschedule successors of moved tasks; the move itself is already committed"""
+    try:
+        return ScheduleService.propagate_dependencies(task_ids)
+    except Exception as e:
+        frappe.logger().error(f"Error propagating task dependencies: {str(e)}")
+        return {"tasks": [], "cycles": [], "blocked_by": {}, "error": str(e)}
+
+@frappe.whitelist()
+def move_tasks(moves):
+    """Move several tasks in one request, all or nothing"""
+    try:
+        if isinstance(moves, str):
+            moves = frappe.parse_json(moves)
         
-        # Emit real-time update
-        emit_task_update(task)
+        result = TaskService.move_tasks(moves, user=frappe.session.user)
         
-        return {
-            "success": True,
-            "task": TaskService.format_task(task),
-            "message": "Task moved successfully"
-        }
+        if result.get("conflicts"):
+            frappe.local.response.http_status_code = 409
+        elif result.get("success"):
+            result["dependencies"] = propagate_dependencies([task["id"] for task in result["tasks"]])
+        
+        return result
         
     except Exception as e:
-        frappe.logger().error(f"Error moving task: {str(e)}")
-        return handle_api_error(e, "Move Task Error")
+        frappe.logger().error(f"Error moving tasks: {str(e)}")
+        return handle_api_error(e, "Move Tasks Error")
+
+@frappe.whitelist()
+def shift_project_schedule(days, project=None, department=None, task_ids=None):
+    """Shift all scheduled tasks of a project (or filter) by N working days"""
+    try:
+        if isinstance(task_ids, str):
+            task_ids = frappe.parse_json(task_ids)
+        
+        return ScheduleService.shift_tasks(
+            days,
+            project=project,
+            department=department,
+            task_ids=task_ids,
+            user=frappe.session.user
+        )
+        
+    except Exception as e:
+        frappe.logger().error(f"Error shifting schedule: {str(e)}")
+        return handle_api_error(e, "Shift Schedule Error")
+
+@frappe.whitelist()
+def auto_schedule_backlog(department=None, start_date=None, end_date=None, task_ids=None, dry_run=1):
+    """Place backlog tasks into free capacity; with dry_run only the proposed moves are returned"""
+    try:
+        if isinstance(task_ids, str):
+            task_ids = frappe.parse_json(task_ids)
+        
+        return ScheduleService.auto_schedule(
+            department=department,
+            start_date=start_date,
+            end_date=end_date,
+            task_ids=task_ids,
+            dry_run=cint(dry_run),
+            user=frappe.session.user
+        )
+        
+    except Exception as e:
+        frappe.logger().error(f"Error auto-scheduling backlog: {str(e)}")
+        return handle_api_error(e, "Auto Schedule Error")
+
+@frappe.whitelist()
+def get_schedule_conflicts(department=None, start_date=None, end_date=None):
+    """Overload windows and overlapping task pairs per assignee"""
+    try:
+        return WorkloadService.get_schedule_conflicts(department, start_date, end_date)
+        
+    except Exception as e:
+        frappe.logger().error(f"Error getting schedule conflicts: {str(e)}")
+        return handle_api_error(e, "Schedule Conflicts Error")
+
+@frappe.whitelist()
+def get_task_dependencies(department=None, start_date=None, end_date=None):
+    """Dependency graph of the visible tasks in topological order, with cycles"""
+    try:
+        return ScheduleService.get_visible_dependencies(department, start_date, end_date)
+        
+    except Exception as e:
+        frappe.logger().error(f"Error getting task dependencies: {str(e)}")
+        return handle_api_error(e, "Task Dependencies Error")
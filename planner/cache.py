@@ -1,93 +1,277 @@
+import time
 import frappe
 from frappe.utils import cint
-from datetime import datetime, timedelta
 
 CACHE_KEYS = {
     'PLANNER_TASKS': 'planner_tasks_{department}',
     'TASK_STATS': 'task_stats_{department}',
+    'WORKLOAD_DATA': 'planner_workload_{department}',
     'USER_PREFERENCES': 'planner_preferences_{user}'
 }
 
 CACHE_EXPIRY = {
-    'PLANNER_TASKS': 300,  # 5 minutes
-    'TASK_STATS': 600,     # 10 minutes
+    'PLANNER_TASKS': 3600,  # 1 hour, invalidated by doc_events on change
+    'TASK_STATS': 3600,     # 1 hour, invalidated by doc_events on change
+    'WORKLOAD_DATA': 3600,  # 1 hour, invalidated by doc_events on change
     'USER_PREFERENCES': 3600  # 1 hour
 }
 
-def get_cached_tasks(department=None):
-    """Get tasks from cache or fetch from database"""
-    cache_key = CACHE_KEYS['PLANNER_TASKS'].format(department=department or 'all')
-    tasks = frappe.cache().get_value(cache_key)
+# Stale-while-revalidate: past the soft TTL an entry is still served, but a
+# background refresh is enqueued. CACHE_EXPIRY acts as the hard TTL.
+CACHE_SOFT_EXPIRY = {
+    'PLANNER_TASKS': 60,
+    'TASK_STATS': 300,
+    'WORKLOAD_DATA': 30
+}
+
+# Single-flight cache fills: one worker recomputes, the others wait for it
+FILL_LOCK_TIMEOUT = 60       # seconds a fill lock is held at most
+FILL_WAIT_TIMEOUT = 5        # seconds a waiter polls before giving up
+FILL_POLL_INTERVAL = 0.1
+LAST_VALUE_EXPIRY = 86400    # previous value kept to serve while a fill runs
+METRICS_KEY = 'planner_cache_metrics'
+
+# Namespace generation counters embedded in every cache key. Bumping a
+# counter orphans all entries of that namespace; they simply expire.
+GENERATION_KEYS = {
+    'global': 'planner_gen_global',
+    'department': 'planner_gen_department_{name}',
+    'user': 'planner_gen_user_{name}'
+}
+
+def _generation_key(scope, name=None):
+    return frappe.cache().make_key(GENERATION_KEYS[scope].format(name=name))
+
+def get_generations(department=None, user=None):
+    """Read the global and scoped generation counters in one round trip"""
+    scopes = [('global', None)]
+    if department:
+        scopes.append(('department', department))
+    if user:
+        scopes.append(('user', user))
+    
+    values = frappe.cache().mget([_generation_key(scope, name) for scope, name in scopes])
+    return {scope: cint(value) for (scope, _name), value in zip(scopes, values)}
+
+def bump_generation(scope, name=None):
+    """Invalidate a whole cache namespace with a single INCR"""
+    return frappe.cache().incr(_generation_key(scope, name))
+
+def get_cache_key(cache_type, department=None, user=None, variant=None):
+    """Build a cache key that embeds the current namespace generations"""
+    if variant:
+        return '{0}:{1}'.format(get_cache_key(cache_type, department, user), variant)
+    
+    if user:
+        key = CACHE_KEYS[cache_type].format(user=user)
+        generations = get_generations(user=user)
+    else:
+        key = CACHE_KEYS[cache_type].format(department=department or 'all')
+        generations = get_generations(department=department or 'all')
+    
+    return '{0}:v{1}'.format(key, '.'.join(str(value) for value in generations.values()))
+
+def record_metric(name, amount=1):
+    """Increment a planner cache counter"""
+    try:
+        frappe.cache().hincrby(frappe.cache().make_key(METRICS_KEY), name, amount)
+    except Exception:
+        pass
+
+def get_cache_metrics():
+    """Return single-flight counters (fills, coalesced, stale_served, wait_timeouts)"""
+    from frappe.utils.redis_wrapper import RedisWrapper
     
-    if tasks is None:
+    # hincrby stores raw integers; RedisWrapper.hgetall would prefix the key
+    # again and try to unpickle the values
+    cache = frappe.cache()
+    metrics = super(RedisWrapper, cache).hgetall(cache.make_key(METRICS_KEY)) or {}
+    return {frappe.safe_decode(name): cint(frappe.safe_decode(value)) for name, value in metrics.items()}
+
+def _wrap(cache_type, value):
+    """Store a value together with the time it stops being fresh and a fill id"""
+    soft_expiry = CACHE_SOFT_EXPIRY.get(cache_type, CACHE_EXPIRY[cache_type])
+    return {'value': value, 'fresh_until': time.time() + soft_expiry, 'fill_id': frappe.generate_hash(length=10)}
+
+def _is_entry(entry):
+    return isinstance(entry, dict) and 'fresh_until' in entry and 'fill_id' in entry
+
+def single_flight_fill(cache_type, cache_key, compute, last_key=None):
+    """Fill cache_key with compute(), letting only one worker recompute at a time
+
+    The worker holding the Redis lock computes and stores the value; the
+    others poll for it briefly and fall back to the previous value stored
+    under ``last_key``, or compute it themselves if there is none.
+    """
+    return _single_flight_fill_entry(cache_type, cache_key, compute, last_key)['value']
+
+def _single_flight_fill_entry(cache_type, cache_key, compute, last_key=None):
+    """single_flight_fill returning the whole wrapped entry that was served"""
+    cache = frappe.cache()
+    lock_key = cache.make_key(f'{cache_key}:lock')
+    token = frappe.generate_hash(length=10)
+    
+    if cache.set(lock_key, token, nx=True, ex=FILL_LOCK_TIMEOUT):
+        try:
+            entry = _wrap(cache_type, compute())
+            cache.set_value(cache_key, entry, expires_in_sec=CACHE_EXPIRY[cache_type])
+            if last_key:
+                cache.set_value(last_key, entry, expires_in_sec=LAST_VALUE_EXPIRY)
+            record_metric('fills')
+            return entry
+        finally:
+            if frappe.safe_decode(cache.get(lock_key)) == token:
+                cache.delete(lock_key)
+    
+    # Another worker is filling this key
+    deadline = time.monotonic() + FILL_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        entry = cache.get_value(cache_key, expires=True)
+        if _is_entry(entry):
+            record_metric('coalesced')
+            return entry
+        
+        if last_key:
+            entry = cache.get_value(last_key, expires=True)
+            if _is_entry(entry):
+                record_metric('stale_served')
+                return entry
+        
+        time.sleep(FILL_POLL_INTERVAL)
+    
+    record_metric('wait_timeouts')
+    return _wrap(cache_type, compute())
+
+def compute_value(cache_type, department=None, start_date=None, end_date=None):
+    """Recompute the payload cached under a cache type"""
+    if cache_type == 'PLANNER_TASKS':
+        from .api import get_planner_tasks
+        return get_planner_tasks(department)
+    
+    if cache_type == 'TASK_STATS':
+        from .services.task_service import TaskService
+        return TaskService.get_task_stats(department)
+    
+    if cache_type == 'WORKLOAD_DATA':
+        from .services.workload_service import WorkloadService
+        return WorkloadService.get_workload_data(department, start_date, end_date)
+    
+    raise ValueError(f"Unknown planner cache type {cache_type}")
+
+def _cache_keys(cache_type, department=None, start_date=None, end_date=None):
+    """Current (generation-scoped) key and stable last-value key of an entry"""
+    variant = f'{start_date or ""}_{end_date or ""}' if cache_type == 'WORKLOAD_DATA' else None
+    cache_key = get_cache_key(cache_type, department=department, variant=variant)
+    last_key = CACHE_KEYS[cache_type].format(department=department or 'all')
+    if variant:
+        last_key += f':{variant}'
+    return cache_key, last_key + ':last'
+
+def get_or_revalidate(cache_type, department=None, start_date=None, end_date=None):
+    """Serve an entry, refreshing it in the background once past its soft TTL"""
+    return get_or_revalidate_entry(cache_type, department, start_date, end_date)[0]
+
+def get_or_revalidate_entry(cache_type, department=None, start_date=None, end_date=None):
+    """Like get_or_revalidate, returning ``(value, version)``
+
+    ``version`` is the generation-scoped key plus the id of the fill that
+    produced the value, so it changes whenever the served value can change
+    and is known without serializing the value.
+    """
+    cache_key, last_key = _cache_keys(cache_type, department, start_date, end_date)
+    entry = frappe.cache().get_value(cache_key)
+    
+    if not _is_entry(entry):
         # Cache miss - fetch from database
-        tasks = fetch_and_cache_tasks(department)
+        entry = _single_flight_fill_entry(
+            cache_type,
+            cache_key,
+            lambda: compute_value(cache_type, department, start_date, end_date),
+            last_key=last_key
+        )
+    elif time.time() > entry['fresh_until']:
+        enqueue_refresh(cache_type, cache_key, department, start_date, end_date)
+    
+    return entry['value'], f"{cache_key}:{entry['fill_id']}"
+
+def enqueue_refresh(cache_type, cache_key, department=None, start_date=None, end_date=None):
+    """Enqueue one background refresh per stale key"""
+    cache = frappe.cache()
+    marker = cache.make_key(f'{cache_key}:refreshing')
+    if not cache.set(marker, 1, nx=True, ex=FILL_LOCK_TIMEOUT):
+        return
     
-    return tasks
+    try:
+        frappe.enqueue(
+            'planner.cache.refresh_cache_entry',
+            queue='short',
+            job_id=f'planner_refresh::{cache_key}',
+            deduplicate=True,
+            cache_type=cache_type,
+            department=department,
+            start_date=start_date,
+            end_date=end_date
+        )
+        record_metric('refreshes_enqueued')
+    except Exception as e:
+        cache.delete(marker)
+        frappe.logger().error(f"Error enqueuing planner cache refresh for {cache_key}: {str(e)}")
+
+def refresh_cache_entry(cache_type, department=None, start_date=None, end_date=None):
+    """Background job: recompute an entry and store it under the current key"""
+    cache_key, last_key = _cache_keys(cache_type, department, start_date, end_date)
+    try:
+        entry = _wrap(cache_type, compute_value(cache_type, department, start_date, end_date))
+        frappe.cache().set_value(cache_key, entry, expires_in_sec=CACHE_EXPIRY[cache_type])
+        frappe.cache().set_value(last_key, entry, expires_in_sec=LAST_VALUE_EXPIRY)
+    finally:
+        frappe.cache().delete(frappe.cache().make_key(f'{cache_key}:refreshing'))
+
+def get_cached_tasks(department=None):
+    """Get tasks from cache or fetch from database"""
+    return get_or_revalidate('PLANNER_TASKS', department)
 
 def fetch_and_cache_tasks(department=None):
     """Fetch tasks from database and update cache"""
-    from .api import get_planner_tasks
+    # Resolve the key first so a concurrent invalidation orphans this result
+    cache_key, last_key = _cache_keys('PLANNER_TASKS', department)
     
-    tasks = get_planner_tasks(department)
-    cache_key = CACHE_KEYS['PLANNER_TASKS'].format(department=department or 'all')
-    
-    frappe.cache().set_value(
+    return single_flight_fill(
+        'PLANNER_TASKS',
         cache_key,
-        tasks,
-        expires_in_sec=CACHE_EXPIRY['PLANNER_TASKS']
+        lambda: compute_value('PLANNER_TASKS', department),
+        last_key=last_key
     )
-    
-    return tasks
 
 def get_cached_stats(department=None):
     """Get task statistics from cache or compute"""
-    cache_key = CACHE_KEYS['TASK_STATS'].format(department=department or 'all')
-    stats = frappe.cache().get_value(cache_key)
-    
-    if stats is None:
-        # Cache miss - compute stats
-        stats = compute_and_cache_stats(department)
-    
-    return stats
+    return get_or_revalidate('TASK_STATS', department)
 
 def compute_and_cache_stats(department=None):
     """Compute task statistics and update cache"""
-    tasks = get_cached_tasks(department)
-    now = datetime.now()
-    
-    stats = {
-        'total': len(tasks),
-        'completed': sum(1 for task in tasks if task.status == 'Completed'),
-        'in_progress': sum(1 for task in tasks if task.status == 'Working'),
-        'overdue': sum(1 for task in tasks if (
-            task.status != 'Completed' and 
-            task.exp_end_date and 
-            datetime.strptime(str(task.exp_end_date), '%Y-%m-%d') < now
-        )),
-        'by_priority': {
-            'high': sum(1 for task in tasks if task.priority == 'High'),
-            'medium': sum(1 for task in tasks if task.priority == 'Medium'),
-            'low': sum(1 for task in tasks if task.priority == 'Low')
-        },
-        'last_updated': str(now)
-    }
+    cache_key, last_key = _cache_keys('TASK_STATS', department)
     
-    cache_key = CACHE_KEYS['TASK_STATS'].format(department=department or 'all')
-    frappe.cache().set_value(
+    return single_flight_fill(
+        'TASK_STATS',
         cache_key,
-        stats,
-        expires_in_sec=CACHE_EXPIRY['TASK_STATS']
+        lambda: compute_value('TASK_STATS', department),
+        last_key=last_key
     )
-    
-    return stats
+
+def get_cached_workload_data(department=None, start_date=None, end_date=None):
+    """Get the per-department workload payload, stale-while-revalidate"""
+    return get_or_revalidate('WORKLOAD_DATA', department, start_date, end_date)
+
+def get_cached_workload_entry(department=None, start_date=None, end_date=None):
+    """Workload payload plus the version of the cache entry it came from"""
+    return get_or_revalidate_entry('WORKLOAD_DATA', department, start_date, end_date)
 
 def get_user_preferences(user=None):
     """Get user preferences from cache"""
     if not user:
         user = frappe.session.user
     
-    cache_key = CACHE_KEYS['USER_PREFERENCES'].format(user=user)
+    cache_key = get_cache_key('USER_PREFERENCES', user=user)
     prefs = frappe.cache().get_value(cache_key)
     
     if prefs is None:
@@ -125,7 +309,7 @@ def fetch_and_cache_preferences(user):
     except frappe.DoesNotExistError:
         prefs = default_prefs
     
-    cache_key = CACHE_KEYS['USER_PREFERENCES'].format(user=user)
+    cache_key = get_cache_key('USER_PREFERENCES', user=user)
     frappe.cache().set_value(
         cache_key,
         prefs,
@@ -136,32 +320,40 @@ def fetch_and_cache_preferences(user):
 
 def clear_task_cache(department=None):
     """Clear task-related caches"""
-    cache_key = CACHE_KEYS['PLANNER_TASKS'].format(department=department or 'all')
-    stats_key = CACHE_KEYS['TASK_STATS'].format(department=department or 'all')
-    
-    frappe.cache().delete_value(cache_key)
-    frappe.cache().delete_value(stats_key)
+    bump_generation('department', department or 'all')
 
 def clear_user_cache(user=None):
     """Clear user-specific cache"""
     if not user:
         user = frappe.session.user
     
-    cache_key = CACHE_KEYS['USER_PREFERENCES'].format(user=user)
-    frappe.cache().delete_value(cache_key)
+    bump_generation('user', user)
 
-def invalidate_all_caches():
-    """Invalidate all planner-related caches"""
-    departments = frappe.get_all('Department', pluck='name')
+def get_affected_departments(doc):
+    """Departments touched by a document change, before and after the save"""
+    departments = {doc.get('department')}
     
-    # Clear task caches for all departments
-    for dept in departments:
-        clear_task_cache(dept)
+    get_doc_before_save = getattr(doc, 'get_doc_before_save', None)
+    previous = get_doc_before_save() if callable(get_doc_before_save) else None
+    if previous:
+        departments.add(previous.get('department'))
     
-    # Clear global task cache
-    clear_task_cache()
+    if doc.doctype == 'Leave Application' and not doc.get('department') and doc.get('employee'):
+        departments.add(frappe.db.get_value('Employee', doc.employee, 'department'))
     
-    # Clear user preference caches
-    users = frappe.get_all('User', pluck='name')
-    for user in users:
-        clear_user_cache(user)
+    return {department for department in departments if department}
+
+def invalidate_for_doc(doc, method=None):
+    """doc_events handler: clear task caches of the departments a document affects"""
+    try:
+        for department in get_affected_departments(doc):
+            clear_task_cache(department)
+        
+        # The unfiltered board includes every department
+        clear_task_cache()
+    except Exception as e:
+        frappe.logger().error(f"Error invalidating planner cache for {doc.doctype} {doc.name}: {str(e)}")
+
+def invalidate_all_caches():
+    """Invalidate all planner-related caches"""
+    bump_generation('global')
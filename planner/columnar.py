@@ -0,0 +1,71 @@
+from frappe.utils import getdate
+
+COLUMNAR_VERSION = 1
+
+# Low-cardinality task fields sent once in a dictionary and referenced by index
+DICTIONARY_COLUMNS = ("assignee", "project", "status", "priority", "color", "type")
+
+# Dates sent as day offsets from the payload origin
+DATE_COLUMNS = ("startDate", "endDate")
+
+PLAIN_COLUMNS = ("id", "title", "duration", "description", "comments_count", "created", "modified")
+
+def encode_tasks(tasks, origin=None):
+    """Encode formatted tasks as column arrays with dictionary-encoded fields
+
+    ``isScheduled`` is left out (the client derives it from the dates) and
+    each task's ``assignees`` become indexes into the assignee dictionary,
+    with names and images sent once per user in ``people``.
+    """
+    if origin:
+        origin = getdate(origin)
+    else:
+        dates = [getdate(task[column]) for task in tasks for column in DATE_COLUMNS if task.get(column)]
+        origin = min(dates) if dates else None
+
+    dictionaries = {column: [] for column in DICTIONARY_COLUMNS}
+    codes = {column: {} for column in DICTIONARY_COLUMNS}
+
+    def encode(column, value):
+        code = codes[column].get(value)
+        if code is None:
+            code = codes[column][value] = len(dictionaries[column])
+            dictionaries[column].append(value)
+        return code
+
+    columns = {column: [] for column in DICTIONARY_COLUMNS + DATE_COLUMNS + PLAIN_COLUMNS}
+    columns["isOverdue"] = []
+    columns["assignees"] = []
+    people = {}
+
+    for task in tasks:
+        for column in DICTIONARY_COLUMNS:
+            columns[column].append(encode(column, task.get(column)))
+
+        for column in DATE_COLUMNS:
+            value = task.get(column)
+            columns[column].append((getdate(value) - origin).days if value else None)
+
+        for column in PLAIN_COLUMNS:
+            value = task.get(column)
+            if column in ("created", "modified") and value is not None:
+                value = str(value)
+            columns[column].append(value)
+
+        columns["isOverdue"].append(1 if task.get("isOverdue") else 0)
+
+        assignee_codes = []
+        for assignee in task.get("assignees") or []:
+            assignee_codes.append(encode("assignee", assignee["id"]))
+            people.setdefault(assignee["id"], {"name": assignee.get("name"), "image": assignee.get("image")})
+        columns["assignees"].append(assignee_codes)
+
+    return {
+        "format": "columnar",
+        "version": COLUMNAR_VERSION,
+        "origin": str(origin) if origin else None,
+        "count": len(tasks),
+        "dictionaries": dictionaries,
+        "people": people,
+        "columns": columns
+    }
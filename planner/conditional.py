@@ -0,0 +1,31 @@
+import hashlib
+import frappe
+
+def compute_etag(*parts):
+    """Build a weak ETag from the parts of a cheap fingerprint"""
+    digest = hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+def _split_etags(value):
+    return [tag.strip() for tag in (value or "").split(",") if tag.strip()]
+
+def is_not_modified(etag):
+    """Check the request's ETag and prepare the response headers
+
+    Returns True when the client copy is current; the caller should then
+    return None without building the payload. A match on If-None-Match is
+    answered as 304 Not Modified; a match on the explicit ``etag`` param
+    (sent by the planner frontend, whose fetch wrapper treats 304 as an
+    error) keeps status 200 with an empty message.
+    """
+    headers = getattr(frappe.local, "response_headers", None)
+    if headers is not None:
+        headers.set("ETag", etag)
+        headers.set("Cache-Control", "private, no-cache")
+
+    request = getattr(frappe, "request", None)
+    if request and etag in _split_etags(request.headers.get("If-None-Match")):
+        frappe.local.response.http_status_code = 304
+        return True
+
+    return etag in _split_etags(frappe.form_dict.get("etag"))
@@ -133,6 +133,31 @@ app_license = "mit"
 # 	}
 # }
 
+doc_events = {
+	"Task": {
+		"on_update": [
+			"planner.cache.invalidate_for_doc",
+			"planner.sync.on_task_update"
+		],
+		"on_trash": [
+			"planner.cache.invalidate_for_doc",
+			"planner.sync.on_task_trash"
+		]
+	},
+	"Employee": {
+		"on_update": "planner.cache.invalidate_for_doc",
+		"on_trash": "planner.cache.invalidate_for_doc"
+	},
+	"Leave Application": {
+		"on_update": "planner.cache.invalidate_for_doc",
+		"on_trash": "planner.cache.invalidate_for_doc"
+	},
+	"Holiday List": {
+		"on_update": "planner.services.calendar_service.clear_calendar_cache",
+		"on_trash": "planner.services.calendar_service.clear_calendar_cache"
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
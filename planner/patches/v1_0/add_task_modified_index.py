@@ -0,0 +1,10 @@
+import frappe
+
+
+def execute():
+    """Index Task rows by department and modified for delta-sync queries"""
+    frappe.db.add_index(
+        "Task",
+        ["department", "modified"],
+        index_name="planner_modified_index"
+    )
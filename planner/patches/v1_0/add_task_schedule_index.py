@@ -0,0 +1,10 @@
+import frappe
+
+
+def execute():
+    """Index Task rows by department, status and schedule window for planner queries"""
+    frappe.db.add_index(
+        "Task",
+        ["department", "status", "exp_start_date", "exp_end_date"],
+        index_name="planner_schedule_index"
+    )
@@ -0,0 +1,12 @@
+import frappe
+
+
+def execute():
+    """Add a FULLTEXT index over Task subject, project and description for backlog search"""
+    if frappe.db.sql("SHOW INDEX FROM `tabTask` WHERE Key_name = 'planner_search_index'"):
+        return
+
+    frappe.db.sql_ddl("""
+        ALTER TABLE `tabTask`
+        ADD FULLTEXT INDEX planner_search_index (subject, project, description)
+    """)
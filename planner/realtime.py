@@ -1,35 +1,153 @@
+import time
 import frappe
+from frappe.utils import cint
 
-def emit_task_update(task):
-    """Emit real-time update for task changes"""
+# Pending cross-request updates, flushed by one job per coalescing window
+PENDING_UPDATES_KEY = 'planner_realtime_pending'
+FLUSH_MARKER_KEY = 'planner_realtime_flush_scheduled'
+
+def get_coalesce_window():
+    """Cross-request coalescing window in seconds (site config planner_realtime_coalesce_ms)"""
+    return cint(frappe.conf.get('planner_realtime_coalesce_ms')) / 1000.0
+
+def get_task_rooms(task):
+    """Document rooms a task change is published to: its department and project
+
+    Clients join them with the standard doc_subscribe("Department", name) /
+    doc_subscribe("Project", name) socket.io calls.
+    """
+    rooms = set()
+    departments = {task.get('department')}
+
+    get_doc_before_save = getattr(task, 'get_doc_before_save', None)
+    previous = get_doc_before_save() if callable(get_doc_before_save) else None
+    if previous:
+        departments.add(previous.get('department'))
+
+    for department in departments:
+        if department:
+            rooms.add(('Department', department))
+    if task.get('project'):
+        rooms.add(('Project', task.project))
+
+    return rooms
+
+def build_task_payload(task, formatted=None):
+    """Formatted task plus the version clients use to discard out-of-order events
+
+    Pass ``formatted`` (from ``TaskService.format_tasks``) to skip formatting
+    the task again.
+    """
+    from .services.task_service import TaskService
+
+    return {
+        'task_id': task.name,
+        'status': task.status,
+        'assignee': task._assign,
+        'modified': str(task.modified),
+        'version': str(task.modified),
+        'department': task.get('department'),
+        'task': formatted or TaskService.format_task(task)
+    }
+
+def _get_buffer():
+    """Request-scoped buffer of changed tasks, flushed after commit"""
+    buffer = getattr(frappe.local, 'planner_realtime_buffer', None)
+    if buffer is None:
+        buffer = frappe.local.planner_realtime_buffer = {}
+        frappe.db.after_commit.add(flush_task_updates)
+        frappe.db.after_rollback.add(discard_task_updates)
+    return buffer
+
+def emit_task_update(task, formatted=None):
+    """Queue a real-time update for task changes, sent once the transaction commits"""
     try:
-        frappe.publish_realtime(
-            'task_update',
-            {
-                'task_id': task.name,
-                'status': task.status,
-                'assignee': task._assign,
-                'modified': str(task.modified)
-            },
-            user=frappe.session.user
-        )
+        buffer = _get_buffer()
+        buffer[task.name] = (build_task_payload(task, formatted), get_task_rooms(task), frappe.session.user)
     except Exception as e:
         frappe.logger().error(f"Error emitting task update: {str(e)}")
 
 def emit_batch_update(tasks):
-    """Emit real-time update for batch task changes"""
+    """Queue real-time updates for batch task changes, formatting the batch once"""
+    from .services.task_service import TaskService
+
     try:
-        updates = [{
-            'task_id': task.name,
-            'status': task.status,
-            'assignee': task._assign,
-            'modified': str(task.modified)
-        } for task in tasks]
-        
-        frappe.publish_realtime(
-            'batch_task_update',
-            {'updates': updates},
-            user=frappe.session.user
-        )
+        formatted = {task["id"]: task for task in TaskService.format_tasks(tasks)}
+    except Exception as e:
+        frappe.logger().error(f"Error formatting batch update: {str(e)}")
+        formatted = {}
+
+    for task in tasks:
+        emit_task_update(task, formatted.get(task.name))
+
+def discard_task_updates():
+    """Drop buffered updates of a rolled back transaction"""
+    frappe.local.planner_realtime_buffer = None
+
+def flush_task_updates():
+    """Publish the buffered updates as one deduplicated batch_task_update per room"""
+    buffer = getattr(frappe.local, 'planner_realtime_buffer', None)
+    frappe.local.planner_realtime_buffer = None
+    if not buffer:
+        return
+
+    try:
+        window = get_coalesce_window()
+        if window > 0:
+            _defer_updates(buffer, window)
+        else:
+            publish_updates(buffer.values())
     except Exception as e:
         frappe.logger().error(f"Error emitting batch update: {str(e)}")
+
+def publish_updates(entries):
+    """Group (payload, rooms, user) entries by target and publish each group once"""
+    targets = {}
+    for payload, rooms, user in entries:
+        for room in rooms:
+            targets.setdefault(room, []).append(payload)
+        if user:
+            targets.setdefault(('User', user), []).append(payload)
+
+    for (doctype, docname), updates in targets.items():
+        if doctype == 'User':
+            frappe.publish_realtime('batch_task_update', {'updates': updates}, user=docname)
+        else:
+            frappe.publish_realtime(
+                'batch_task_update',
+                {'updates': updates},
+                doctype=doctype,
+                docname=docname
+            )
+
+def _defer_updates(buffer, window):
+    """Merge updates into the shared pending set and schedule one flush per window"""
+    cache = frappe.cache()
+    for task_name, entry in buffer.items():
+        cache.hset(PENDING_UPDATES_KEY, task_name, entry)
+
+    if cache.set(cache.make_key(FLUSH_MARKER_KEY), 1, nx=True, ex=max(1, int(window * 10))):
+        frappe.enqueue(
+            'planner.realtime.flush_pending_updates',
+            queue='short',
+            window=window
+        )
+
+def flush_pending_updates(window=0):
+    """Background job: publish every update gathered during the coalescing window"""
+    cache = frappe.cache()
+    time.sleep(window)
+
+    # Allow the next window to be scheduled before draining this one
+    cache.delete(cache.make_key(FLUSH_MARKER_KEY))
+
+    draining_key = f'{PENDING_UPDATES_KEY}:{frappe.generate_hash(length=8)}'
+    try:
+        cache.rename(cache.make_key(PENDING_UPDATES_KEY), cache.make_key(draining_key))
+    except Exception:
+        # Nothing pending
+        return
+
+    entries = cache.hgetall(draining_key) or {}
+    cache.delete_value(draining_key)
+    publish_updates(entries.values())
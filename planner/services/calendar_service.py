@@ -0,0 +1,222 @@
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+import frappe
+from frappe.utils import getdate, date_diff
+
+CALENDAR_CACHE_KEY = 'planner_calendar_{holiday_list}_{anchor}'
+CALENDAR_CACHE_EXPIRY = 86400  # 1 day, cleared early by Holiday List doc_events
+LOCAL_CACHE_EXPIRY = 300       # 5 minutes per worker process
+
+HORIZON_YEARS_BEFORE = 2
+HORIZON_YEARS = 7
+
+WEEKDAYS_ONLY = '__weekdays__'
+
+# holiday_list -> (loaded_at, anchor, prefix)
+_local_calendars = {}
+
+
+class CalendarService:
+    """Working-day calendars backed by per-Holiday-List prefix sums
+
+    ``prefix[i]`` holds the number of working days (Monday to Friday, not a
+    holiday) in ``[anchor, anchor + i)``, so the working days in any range
+    inside the horizon are two lookups and a subtraction.
+    """
+
+    @staticmethod
+    def get_horizon_anchor(today=None):
+        """First day covered by the calendar horizon"""
+        today = getdate(today)
+        return date(today.year - HORIZON_YEARS_BEFORE, 1, 1)
+
+    @staticmethod
+    def build_prefix(anchor, holidays=()):
+        """Build the cumulative working-day array for the horizon starting at anchor"""
+        end = date(anchor.year + HORIZON_YEARS, 1, 1)
+        days = (end - anchor).days
+        holiday_offsets = {
+            (getdate(holiday) - anchor).days for holiday in holidays
+        }
+
+        prefix = array('H', [0]) * (days + 1)
+        weekday = anchor.weekday()
+        count = 0
+        for offset in range(days):
+            if weekday < 5 and offset not in holiday_offsets:
+                count += 1
+            prefix[offset + 1] = count
+            weekday = (weekday + 1) % 7
+
+        return prefix
+
+    @staticmethod
+    def get_calendar(holiday_list=None):
+        """Return (anchor, prefix) for a Holiday List, loading from cache when possible"""
+        holiday_list = holiday_list or WEEKDAYS_ONLY
+        anchor = CalendarService.get_horizon_anchor()
+
+        local = _local_calendars.get(holiday_list)
+        if local and local[1] == anchor and time.monotonic() - local[0] < LOCAL_CACHE_EXPIRY:
+            return local[1], local[2]
+
+        cache_key = CALENDAR_CACHE_KEY.format(holiday_list=holiday_list, anchor=anchor.isoformat())
+        prefix = frappe.cache().get_value(cache_key)
+
+        if prefix is None:
+            holidays = []
+            if holiday_list != WEEKDAYS_ONLY:
+                holidays = frappe.get_all(
+                    "Holiday",
+                    filters={"parent": holiday_list, "parenttype": "Holiday List"},
+                    pluck="holiday_date"
+                )
+            prefix = CalendarService.build_prefix(anchor, holidays)
+            frappe.cache().set_value(cache_key, prefix, expires_in_sec=CALENDAR_CACHE_EXPIRY)
+
+        _local_calendars[holiday_list] = (time.monotonic(), anchor, prefix)
+        return anchor, prefix
+
+    @staticmethod
+    def count_weekdays(start_date, end_date):
+        """Count Monday-Friday days in an inclusive range without iterating"""
+        if end_date < start_date:
+            return 0
+        total_days = date_diff(end_date, start_date) + 1
+        weeks, remainder = divmod(total_days, 7)
+        first = start_date.weekday()
+        extra = sum(1 for i in range(remainder) if (first + i) % 7 < 5)
+        return weeks * 5 + extra
+
+    @staticmethod
+    def count_working_days(holiday_list, start_date, end_date):
+        """Count working days in an inclusive range for a Holiday List
+
+        Parts of the range outside the cached horizon fall back to plain
+        weekday counting.
+        """
+        if not start_date or not end_date:
+            return 0
+
+        start_date = getdate(start_date)
+        end_date = getdate(end_date)
+        if end_date < start_date:
+            return 0
+
+        anchor, prefix = CalendarService.get_calendar(holiday_list)
+        horizon_end = anchor + timedelta(days=len(prefix) - 2)
+
+        working_days = 0
+        if start_date < anchor:
+            working_days += CalendarService.count_weekdays(
+                start_date, min(end_date, anchor - timedelta(days=1))
+            )
+        if end_date > horizon_end:
+            working_days += CalendarService.count_weekdays(
+                max(start_date, horizon_end + timedelta(days=1)), end_date
+            )
+
+        lo = max(start_date, anchor)
+        hi = min(end_date, horizon_end)
+        if lo <= hi:
+            working_days += prefix[(hi - anchor).days + 1] - prefix[(lo - anchor).days]
+
+        return working_days
+
+    @staticmethod
+    def add_working_days(holiday_list, value, days, is_end=False):
+        """Move a date by `days` working days (negative moves it earlier)
+
+        A start date on a non-working day counts from the next working day,
+        an end date (``is_end``) from the previous one, so the result is
+        always a working day. Inside the horizon this is one bisect on the
+        prefix array.
+        """
+        value = getdate(value)
+        anchor, prefix = CalendarService.get_calendar(holiday_list)
+        index = (value - anchor).days
+
+        if 0 <= index < len(prefix) - 1:
+            if is_end:
+                # Last working day whose inclusive count reaches the target
+                target = prefix[index + 1] + days
+                if 1 <= target <= prefix[-1]:
+                    return anchor + timedelta(days=bisect_left(prefix, target) - 1)
+            else:
+                # Working day preceded by exactly `target` working days
+                target = prefix[index] + days
+                if 0 <= target < prefix[-1]:
+                    return anchor + timedelta(days=bisect_right(prefix, target) - 1)
+
+        # Outside the horizon: step over weekdays only
+        step = -1 if is_end else 1
+        while value.weekday() >= 5:
+            value += timedelta(days=step)
+
+        step = 1 if days > 0 else -1
+        remaining = abs(days)
+        while remaining:
+            value += timedelta(days=step)
+            if value.weekday() < 5:
+                remaining -= 1
+        return value
+
+    @staticmethod
+    def get_working_mask(holiday_list, start_date, days):
+        """Return a list of 1/0 flags marking working days from start_date for `days` days"""
+        start_date = getdate(start_date)
+        anchor, prefix = CalendarService.get_calendar(holiday_list)
+        offset = (start_date - anchor).days
+
+        mask = []
+        for i in range(days):
+            index = offset + i
+            if 0 <= index < len(prefix) - 1:
+                mask.append(prefix[index + 1] - prefix[index])
+            else:
+                mask.append(1 if (start_date + timedelta(days=i)).weekday() < 5 else 0)
+        return mask
+
+    @staticmethod
+    def get_employee_holiday_list(employee_id):
+        """Resolve the Holiday List of an employee given its user id or Employee name"""
+        if not employee_id or employee_id == "unassigned":
+            return None
+
+        employee = frappe.db.get_value(
+            "Employee",
+            {"user_id": employee_id},
+            ["holiday_list", "company"],
+            as_dict=True
+        ) or frappe.db.get_value(
+            "Employee",
+            employee_id,
+            ["holiday_list", "company"],
+            as_dict=True
+        )
+        if not employee:
+            return None
+
+        return employee.holiday_list or frappe.get_cached_value(
+            "Company", employee.company, "default_holiday_list"
+        )
+
+
+def clear_calendar_cache(doc=None, method=None):
+    """Drop cached calendars, for one Holiday List when called from doc_events"""
+    holiday_lists = [doc.name] if doc else list(_local_calendars)
+    anchor = CalendarService.get_horizon_anchor()
+
+    for holiday_list in holiday_lists:
+        _local_calendars.pop(holiday_list, None)
+        frappe.cache().delete_value(
+            CALENDAR_CACHE_KEY.format(holiday_list=holiday_list, anchor=anchor.isoformat())
+        )
+
+    if doc:
+        # Capacity in every cached workload payload may have changed
+        from planner.cache import invalidate_all_caches
+        invalidate_all_caches()
@@ -0,0 +1,74 @@
+from collections import defaultdict, deque
+
+
+class DependencyGraph:
+    """Task dependency graph built from ``Task Depends On`` rows
+
+    An edge ``(predecessor, successor)`` means the successor's ``depends_on``
+    table lists the predecessor, so the successor may only start after the
+    predecessor ends.
+    """
+
+    def __init__(self, edges=()):
+        self.successors = defaultdict(set)
+        self.predecessors = defaultdict(set)
+        self.nodes = set()
+        for predecessor, successor in edges:
+            self.successors[predecessor].add(successor)
+            self.predecessors[successor].add(predecessor)
+            self.nodes.update((predecessor, successor))
+
+    def edges(self):
+        return [
+            (predecessor, successor)
+            for predecessor, successors in self.successors.items()
+            for successor in sorted(successors)
+        ]
+
+    def topological_order(self, nodes=None):
+        """Kahn's algorithm over ``nodes`` (default: the whole graph)
+
+        Returns ``(order, cyclic)``: the sorted nodes, and the nodes left over
+        because they sit on or behind a cycle.
+        """
+        nodes = self.nodes if nodes is None else set(nodes)
+        in_degree = {
+            node: sum(1 for predecessor in self.predecessors[node] if predecessor in nodes)
+            for node in nodes
+        }
+
+        queue = deque(sorted(node for node, degree in in_degree.items() if not degree))
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for successor in self.successors[node]:
+                if successor in in_degree:
+                    in_degree[successor] -= 1
+                    if not in_degree[successor]:
+                        queue.append(successor)
+
+        cyclic = sorted(node for node, degree in in_degree.items() if degree)
+        return order, cyclic
+
+    def downstream(self, task_ids):
+        """All tasks reachable from task_ids through successor edges, excluding task_ids"""
+        seen = set(task_ids)
+        stack = list(task_ids)
+        while stack:
+            for successor in self.successors[stack.pop()]:
+                if successor not in seen:
+                    seen.add(successor)
+                    stack.append(successor)
+        return seen - set(task_ids)
+
+    def downstream_order(self, task_ids):
+        """Topological order of only the tasks affected by changes to task_ids
+
+        The moved tasks come first so their successors see their new dates;
+        only the reachable subgraph is sorted, which keeps propagation after
+        a move proportional to what actually depends on it.
+        """
+        affected = self.downstream(task_ids)
+        order, cyclic = self.topological_order(affected | set(task_ids))
+        return [node for node in order if node in affected], cyclic
@@ -0,0 +1,142 @@
+import heapq
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from frappe.utils import getdate
+
+# Rounding slack when comparing summed hours against capacity
+LOAD_TOLERANCE = 0.01
+
+
+class IntervalIndex:
+    """Scheduled tasks of one assignee, sorted by start date
+
+    Each interval is ``(start_date, end_date, task_id, hours_per_day)`` with
+    inclusive dates. Starts are kept sorted next to a running maximum of end
+    dates, so "what overlaps this range" is a bisect plus a walk over the
+    candidates that can still reach it.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(
+            (getdate(start), getdate(end), task_id, rate)
+            for start, end, task_id, rate in intervals
+        )
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.task_ids = [interval[2] for interval in intervals]
+        self.rates = [interval[3] for interval in intervals]
+
+        self.max_ends = []
+        latest = None
+        for end in self.ends:
+            latest = end if latest is None or end > latest else latest
+            self.max_ends.append(latest)
+
+    @classmethod
+    def by_assignee(cls, intervals):
+        """Build one index per assignee from ``(assignee, start, end, task_id, rate)`` tuples"""
+        grouped = defaultdict(list)
+        for assignee, start, end, task_id, rate in intervals:
+            grouped[assignee].append((start, end, task_id, rate))
+        return {assignee: cls(rows) for assignee, rows in grouped.items()}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find_overlapping(self, start_date, end_date, exclude=None):
+        """Task ids whose interval intersects [start_date, end_date]"""
+        start_date = getdate(start_date)
+        end_date = getdate(end_date)
+
+        found = []
+        i = bisect_right(self.starts, end_date) - 1
+        while i >= 0 and self.max_ends[i] >= start_date:
+            if self.ends[i] >= start_date and self.task_ids[i] != exclude:
+                found.append(self.task_ids[i])
+            i -= 1
+        found.reverse()
+        return found
+
+    def is_free(self, start_date, end_date, exclude=None):
+        return not self.find_overlapping(start_date, end_date, exclude=exclude)
+
+    def overlapping_pairs(self):
+        """Every pair of overlapping tasks with the shared date range
+
+        Sweeps intervals by start date while a heap holds the ones still
+        running, so the cost is O(n log n) plus the number of pairs.
+        """
+        pairs = []
+        active = []
+        for start, end, task_id in zip(self.starts, self.ends, self.task_ids):
+            while active and active[0][0] < start:
+                heapq.heappop(active)
+            for other_end, other_id in active:
+                pairs.append({
+                    "task_a": other_id,
+                    "task_b": task_id,
+                    "start_date": start,
+                    "end_date": min(end, other_end)
+                })
+            heapq.heappush(active, (end, task_id))
+        return pairs
+
+    def overload_windows(self, capacity, is_working=None):
+        """Date ranges where the summed daily hours exceed ``capacity``
+
+        Each task contributes its hours per working day from its start to its
+        end date; load changes are swept in date order. ``is_working(day)``
+        marks the days that carry load (weekends, holidays and leave do not);
+        a non-working day ends a window. Without it every day counts.
+        """
+        events = []
+        for start, end, task_id, rate in zip(self.starts, self.ends, self.task_ids, self.rates):
+            events.append((start, rate, task_id))
+            events.append((end + timedelta(days=1), -rate, task_id))
+        events.sort(key=lambda event: event[0])
+
+        windows = []
+        window = None
+        load = 0
+        active = set()
+
+        def close(last_day):
+            window["end_date"] = last_day
+            window["tasks"] = sorted(window["tasks"])
+            windows.append(window)
+
+        i = 0
+        while i < len(events):
+            day = events[i][0]
+            while i < len(events) and events[i][0] == day:
+                _day, rate, task_id = events[i]
+                load += rate
+                if rate > 0:
+                    active.add(task_id)
+                else:
+                    active.discard(task_id)
+                i += 1
+
+            # The load is constant until the next event
+            next_day = events[i][0] if i < len(events) else day
+            if load <= capacity + LOAD_TOLERANCE:
+                if window is not None:
+                    close(day - timedelta(days=1))
+                    window = None
+                continue
+
+            current = day
+            while current < next_day:
+                if is_working is None or is_working(current):
+                    if window is None:
+                        window = {"start_date": current, "peak_hours": 0, "tasks": set()}
+                    window["peak_hours"] = max(window["peak_hours"], round(load, 2))
+                    window["tasks"].update(active)
+                elif window is not None:
+                    close(current - timedelta(days=1))
+                    window = None
+                current += timedelta(days=1)
+
+        return windows
@@ -0,0 +1,466 @@
+import heapq
+from datetime import date
+
+import frappe
+from frappe import _
+from frappe.utils import now_datetime, getdate, cint, flt
+from .task_service import TaskService, TASK_FIELDS, SCHEDULABLE_STATUSES
+from .workload_service import WorkloadService
+from .calendar_service import CalendarService
+from .dependency_graph import DependencyGraph
+from ..realtime import emit_batch_update
+
+
+# Backlog order: higher priority first
+PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+# Hours assumed for backlog tasks without expected_time
+DEFAULT_TASK_HOURS = 8
+
+# Rounding slack when comparing fractional free hours
+HOURS_TOLERANCE = 0.01
+
+
+class ScheduleService:
+    @staticmethod
+    def save_schedule(changes_by_task, rows):
+        """Write date/assignee changes in one transaction and notify clients
+
+        ``rows`` maps task names to the loaded Task rows; they are updated in
+        place and the changed ones are returned.
+        """
+        if not changes_by_task:
+            return []
+
+        modified = now_datetime()
+        changed = []
+        for task_id, changes in changes_by_task.items():
+            row = rows[task_id]
+            row.update(changes)
+            row.modified = modified
+            changed.append(row)
+
+        TaskService.apply_bulk_changes(changes_by_task, modified)
+        # Queued before the commit so the buffer is flushed by it
+        emit_batch_update(changed)
+        frappe.db.commit()
+
+        # Bulk UPDATEs bypass doc_events, so invalidate caches here
+        from ..cache import clear_task_cache
+        for department in {row.department for row in changed if row.department}:
+            clear_task_cache(department)
+        clear_task_cache()
+
+        return changed
+
+    @staticmethod
+    def get_holiday_lists(rows):
+        """Map each task to the Holiday List of its primary assignee with one query"""
+        assignees = {}
+        for row in rows:
+            assigned = TaskService.parse_assign(row)
+            assignees[row.name] = assigned[0] if assigned else None
+
+        records = WorkloadService.get_employee_records(assignees.values())
+        return {
+            task_id: records[assignee].holiday_list if assignee in records else None
+            for task_id, assignee in assignees.items()
+        }
+
+    @staticmethod
+    def shift_tasks(days, project=None, department=None, task_ids=None, user=None):
+        """Shift every scheduled task of a project (or filter) by N working days
+
+        Dates move along the primary assignee's holiday calendar. All rows are
+        locked and read with one query, new dates are computed in memory and
+        written with set-based UPDATEs in a single transaction. Only tasks
+        whose dates actually changed are returned.
+        """
+        days = cint(days)
+        if not (project or department or task_ids):
+            frappe.throw(_("A project, department or list of tasks is required"))
+
+        # Authorization check
+        if user and not frappe.has_permission("Task", "write", user=user):
+            frappe.throw(_("Not authorized to reschedule tasks"), frappe.PermissionError)
+
+        if not days:
+            return {"success": True, "shifted": 0, "tasks": []}
+
+        # Built directly: get_task_conditions drops an unknown department,
+        # which would widen this write to every task on the site
+        conditions = [
+            "status IN %(statuses)s",
+            "exp_start_date IS NOT NULL",
+            "exp_end_date IS NOT NULL"
+        ]
+        values = {"statuses": SCHEDULABLE_STATUSES}
+        if department:
+            if not frappe.db.exists("Department", department):
+                frappe.throw(_("Department {0} not found").format(department), frappe.DoesNotExistError)
+            conditions.append("department = %(department)s")
+            values["department"] = department
+        if project:
+            conditions.append("project = %(project)s")
+            values["project"] = project
+        if task_ids:
+            conditions.append("name IN %(task_ids)s")
+            values["task_ids"] = tuple(task_ids)
+
+        rows = frappe.db.sql("""
+            SELECT {fields}
+            FROM `tabTask`
+            WHERE {conditions}
+            FOR UPDATE
+        """.format(
+            fields=", ".join(f"`{field}`" for field in TASK_FIELDS),
+            conditions=" AND ".join(conditions)
+        ), values, as_dict=True)
+
+        holiday_lists = ScheduleService.get_holiday_lists(rows)
+
+        # Tasks of one project share few distinct (calendar, date) pairs
+        shifted_dates = {}
+        def shift(holiday_list, value, is_end):
+            key = (holiday_list, value, is_end)
+            if key not in shifted_dates:
+                shifted_dates[key] = CalendarService.add_working_days(holiday_list, value, days, is_end)
+            return shifted_dates[key]
+
+        changes_by_task = {}
+        for row in rows:
+            holiday_list = holiday_lists.get(row.name)
+            start = shift(holiday_list, getdate(row.exp_start_date), False)
+            end = max(start, shift(holiday_list, getdate(row.exp_end_date), True))
+
+            changes = {}
+            if start != getdate(row.exp_start_date):
+                changes["exp_start_date"] = start
+            if end != getdate(row.exp_end_date):
+                changes["exp_end_date"] = end
+            if changes:
+                changes_by_task[row.name] = changes
+
+        changed = ScheduleService.save_schedule(
+            changes_by_task, {row.name: row for row in rows}
+        )
+
+        return {
+            "success": True,
+            "shifted": len(changed),
+            "tasks": TaskService.format_tasks(changed)
+        }
+
+    @staticmethod
+    def get_backlog_rows(department=None, task_ids=None):
+        """Unscheduled planner tasks in scheduling order: priority, due date, age"""
+        conditions = [
+            "status IN %(statuses)s",
+            "(exp_start_date IS NULL OR exp_end_date IS NULL)"
+        ]
+        values = {"statuses": SCHEDULABLE_STATUSES}
+        if department:
+            conditions.append("department = %(department)s")
+            values["department"] = department
+        if task_ids:
+            conditions.append("name IN %(task_ids)s")
+            values["task_ids"] = tuple(task_ids)
+
+        rows = frappe.db.sql("""
+            SELECT {fields}
+            FROM `tabTask`
+            WHERE {conditions}
+        """.format(
+            fields=", ".join(f"`{field}`" for field in TASK_FIELDS),
+            conditions=" AND ".join(conditions)
+        ), values, as_dict=True)
+
+        rows.sort(key=lambda row: (
+            PRIORITY_RANK.get(row.priority, len(PRIORITY_RANK)),
+            getdate(row.exp_end_date) if row.exp_end_date else date.max,
+            row.creation
+        ))
+        return rows
+
+    @staticmethod
+    def plan_backlog(tasks, employees, free):
+        """Greedily place tasks into free capacity
+
+        ``tasks`` is a list of ``(task_id, hours, assignee or None)`` in
+        scheduling order, ``free`` the free hours per employee and day. A heap
+        keyed on each employee's first day with free capacity picks who takes
+        an unassigned task; every task is packed from that day onwards until
+        its hours are covered. Per-employee day cursors only move forward, so
+        the day scanning adds up to O(employees * days) over the whole pass.
+        Picking an assignee is O(log(employees)) when the earliest employee has
+        room for the task; employees popped because their remaining hours are
+        too small are pushed back, which costs up to O(employees) per task
+        once most of the team is nearly full.
+
+        Returns ``(placements, unplaced)`` where placements are
+        ``(task_id, assignee, first_day, last_day)`` with day indexes.
+        """
+        free = [list(row) for row in free]
+        days = len(free[0]) if free else 0
+        row_index = {employee_id: i for i, employee_id in enumerate(employees)}
+        cursors = [0] * len(employees)
+        remaining = [sum(row) for row in free]
+
+        def advance(i):
+            while cursors[i] < days and free[i][cursors[i]] <= HOURS_TOLERANCE:
+                cursors[i] += 1
+            return cursors[i]
+
+        def place(i, hours):
+            first = advance(i)
+            day = first
+            while True:
+                used = min(hours, free[i][day])
+                free[i][day] -= used
+                remaining[i] -= used
+                hours -= used
+                if hours <= HOURS_TOLERANCE or day == days - 1:
+                    break
+                day += 1
+            advance(i)
+            return first, day
+
+        heap = [(advance(i), i) for i in range(len(employees))]
+        heapq.heapify(heap)
+
+        placements = []
+        unplaced = []
+        for task_id, hours, assignee in tasks:
+            if assignee is not None:
+                i = row_index.get(assignee)
+                if i is None or remaining[i] < hours - HOURS_TOLERANCE:
+                    unplaced.append(task_id)
+                    continue
+                first, last = place(i, hours)
+                placements.append((task_id, assignee, first, last))
+                # The heap entry for i is now stale and fixed up lazily below
+                continue
+
+            skipped = []
+            chosen = None
+            while heap:
+                cursor, i = heapq.heappop(heap)
+                if cursor != cursors[i]:
+                    heapq.heappush(heap, (cursors[i], i))
+                    continue
+                if remaining[i] >= hours - HOURS_TOLERANCE:
+                    chosen = i
+                    break
+                if cursors[i] < days:
+                    skipped.append((cursor, i))
+
+            for entry in skipped:
+                heapq.heappush(heap, entry)
+
+            if chosen is None:
+                unplaced.append(task_id)
+                continue
+
+            first, last = place(chosen, hours)
+            placements.append((task_id, employees[chosen], first, last))
+            if cursors[chosen] < days:
+                heapq.heappush(heap, (cursors[chosen], chosen))
+
+        return placements, unplaced
+
+    @staticmethod
+    def auto_schedule(department=None, start_date=None, end_date=None, task_ids=None,
+                      dry_run=True, user=None):
+        """Place backlog tasks into the department's free capacity
+
+        Free hours per employee and day come from the workload matrix
+        (available minus already scheduled). With ``dry_run`` the proposed
+        moves are only returned; otherwise they are saved in one transaction.
+        """
+        if not dry_run and user and not frappe.has_permission("Task", "write", user=user):
+            frappe.throw(_("Not authorized to schedule tasks"), frappe.PermissionError)
+
+        matrix = WorkloadService.get_workload_matrix(department, start_date, end_date)
+        employees = matrix["employees"]
+        free = [
+            [max(flt(available) - flt(scheduled), 0) for available, scheduled in zip(available_row, scheduled_row)]
+            for available_row, scheduled_row in zip(matrix["available"], matrix["scheduled"])
+        ]
+
+        rows = ScheduleService.get_backlog_rows(department, task_ids)
+        by_name = {row.name: row for row in rows}
+
+        tasks = []
+        for row in rows:
+            assigned = TaskService.parse_assign(row)
+            tasks.append((
+                row.name,
+                flt(row.expected_time) or DEFAULT_TASK_HOURS,
+                assigned[0] if assigned else None
+            ))
+
+        placements, unplaced = ScheduleService.plan_backlog(tasks, employees, free)
+
+        moves = []
+        changes_by_task = {}
+        for task_id, assignee, first, last in placements:
+            row = by_name[task_id]
+            start = matrix["days"][first]
+            end = matrix["days"][last]
+            moves.append({
+                "task_id": task_id,
+                "subject": row.subject,
+                "assignee_id": assignee,
+                "start_date": str(start),
+                "end_date": str(end),
+                "late": bool(row.exp_end_date and getdate(row.exp_end_date) < getdate(end))
+            })
+
+            changes = {"exp_start_date": start, "exp_end_date": end}
+            if TaskService.parse_assign(row)[:1] != [assignee]:
+                changes["_assign"] = frappe.as_json([assignee])
+            changes_by_task[task_id] = changes
+
+        result = {
+            "success": True,
+            "dry_run": bool(dry_run),
+            "moves": moves,
+            "unplaced": unplaced
+        }
+
+        if not dry_run:
+            ScheduleService.save_schedule(changes_by_task, by_name)
+
+        return result
+
+    @staticmethod
+    def get_dependency_graph(conditions, values):
+        """Load the dependency edges of the tasks matching conditions in one query"""
+        edges = frappe.db.sql("""
+            SELECT dep.task, dep.parent
+            FROM `tabTask Depends On` dep
+            WHERE dep.parenttype = 'Task'
+            AND dep.task IS NOT NULL
+            AND ({conditions})
+        """.format(conditions=conditions), values)
+        return DependencyGraph(edges)
+
+    @staticmethod
+    def get_visible_dependencies(department=None, start_date=None, end_date=None):
+        """Dependency edges, topological order and cycles of the planner's visible tasks"""
+        conditions, values = TaskService.get_task_conditions(department, start_date, end_date)
+        graph = ScheduleService.get_dependency_graph(
+            "dep.parent IN (SELECT name FROM `tabTask` WHERE {0})".format(" AND ".join(conditions)),
+            values
+        )
+        order, cyclic = graph.topological_order()
+        return {
+            "edges": [{"predecessor": a, "successor": b} for a, b in graph.edges()],
+            "order": order,
+            "cycles": cyclic
+        }
+
+    @staticmethod
+    def propagate_dependencies(task_ids):
+        """Push successors of moved tasks so none starts before its predecessors end
+
+        The graph of the moved tasks' projects is loaded with one query;
+        only the tasks downstream of task_ids and their direct predecessors
+        are read and locked, in topological order. A successor that now
+        starts too early is moved to the next working day after its latest
+        predecessor, keeping its length in working days. Tasks on a
+        dependency cycle are left alone and listed.
+        """
+        task_ids = list(task_ids or [])
+        if not task_ids:
+            return {"tasks": [], "cycles": [], "blocked_by": {}}
+
+        projects = [
+            project for project in frappe.get_all(
+                "Task", filters={"name": ["in", task_ids]}, pluck="project"
+            ) if project
+        ]
+        scope = "dep.task IN %(task_ids)s"
+        values = {"task_ids": tuple(task_ids)}
+        if projects:
+            scope += " OR dep.parent IN (SELECT name FROM `tabTask` WHERE project IN %(projects)s)"
+            values["projects"] = tuple(set(projects))
+        graph = ScheduleService.get_dependency_graph(scope, values)
+
+        order, cyclic = graph.downstream_order(task_ids)
+        if not order and not any(graph.predecessors[task_id] for task_id in task_ids):
+            return {"tasks": [], "cycles": cyclic, "blocked_by": {}}
+
+        # Only the affected tasks, their direct predecessors and the moved
+        # tasks are read; rows are locked only when something will be written
+        names = set(task_ids)
+        for task_id in list(order) + task_ids:
+            names.update(graph.predecessors[task_id])
+        names.update(order)
+
+        rows = {
+            row.name: row
+            for row in frappe.db.sql("""
+                SELECT {fields}
+                FROM `tabTask`
+                WHERE name IN %(names)s
+                {lock}
+            """.format(
+                fields=", ".join(f"`{field}`" for field in TASK_FIELDS),
+                lock="FOR UPDATE" if order else ""
+            ), {"names": tuple(names)}, as_dict=True)
+        }
+        dates = {
+            name: (getdate(row.exp_start_date), getdate(row.exp_end_date))
+            for name, row in rows.items()
+            if row.exp_start_date and row.exp_end_date
+        }
+
+        # Moved tasks that still start before one of their predecessors ends
+        blocked_by = {}
+        for task_id in task_ids:
+            if task_id not in dates:
+                continue
+            blocking = [
+                predecessor for predecessor in sorted(graph.predecessors[task_id])
+                if predecessor in dates and dates[predecessor][1] >= dates[task_id][0]
+            ]
+            if blocking:
+                blocked_by[task_id] = blocking
+
+        if not order:
+            return {"tasks": [], "cycles": cyclic, "blocked_by": blocked_by}
+
+        holiday_lists = ScheduleService.get_holiday_lists([rows[name] for name in order if name in rows])
+        changes_by_task = {}
+        for task_id in order:
+            if task_id not in dates:
+                continue
+
+            holiday_list = holiday_lists.get(task_id)
+            required = None
+            for predecessor in graph.predecessors[task_id]:
+                if predecessor not in dates:
+                    continue
+                earliest = CalendarService.add_working_days(
+                    holiday_list, dates[predecessor][1], 1, is_end=True
+                )
+                required = earliest if required is None else max(required, earliest)
+
+            start, end = dates[task_id]
+            if required is None or start >= required:
+                continue
+
+            length = max(CalendarService.count_working_days(holiday_list, start, end), 1)
+            new_start = CalendarService.add_working_days(holiday_list, required, 0)
+            new_end = CalendarService.add_working_days(holiday_list, new_start, length - 1)
+            dates[task_id] = (new_start, new_end)
+            changes_by_task[task_id] = {"exp_start_date": new_start, "exp_end_date": new_end}
+
+        changed = ScheduleService.save_schedule(changes_by_task, rows)
+
+        return {
+            "tasks": TaskService.format_tasks(changed),
+            "cycles": cyclic,
+            "blocked_by": blocked_by
+        }
@@ -1,8 +1,38 @@
+import base64
+import json
+import re
 import frappe
 from frappe import _
-from frappe.utils import now_datetime, get_datetime, getdate
+from frappe.utils import now_datetime, get_datetime, getdate, cint, flt
 from ..realtime import emit_task_update, emit_batch_update
 
+ACTIVE_STATUSES = ("Open", "Working", "Completed", "Overdue")
+
+# Statuses whose dates the scheduler may still move
+SCHEDULABLE_STATUSES = ("Open", "Working", "Overdue")
+
+TASK_FIELDS = [
+    "name", "subject", "status", "priority", "project",
+    "exp_start_date", "exp_end_date", "expected_time",
+    "department", "description", "color", "type",
+    "_assign", "_comments", "_seen", "creation",
+    "modified", "owner"
+]
+
+# Fields the planner is allowed to change on a Task
+VALID_FIELDS = [
+    "status", "priority", "exp_start_date",
+    "exp_end_date", "expected_time", "description"
+]
+
+BULK_UPDATE_CHUNK_SIZE = 500
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+# Backlog search: FULLTEXT index added by planner.patches.v1_0.add_task_search_index
+SEARCH_MIN_TOKEN_SIZE = 3  # innodb_ft_min_token_size; shorter words are not indexed
+
 class TaskService:
     @staticmethod
     def get_task_color(task):
@@ -23,48 +53,77 @@ class TaskService:
         return status_colors.get(task.status) or priority_colors.get(task.priority) or "#6B7280"
 
     @staticmethod
-    def get_task_assignees(task):
+    def parse_assign(task):
+        """Parse the _assign JSON field into a list of user ids"""
+        if not task._assign:
+            return []
+        return frappe.parse_json(task._assign) or []
+
+    @staticmethod
+    def get_user_map(users):
+        """Resolve existence and profile info for a set of users in one query"""
+        users = {user for user in users if user}
+        if not users:
+            return {}
+
+        rows = frappe.get_all(
+            "User",
+            filters={"name": ["in", list(users)]},
+            fields=["name", "full_name", "user_image"]
+        )
+        return {row.name: row for row in rows}
+
+    @staticmethod
+    def get_task_assignees(task, user_map=None):
         """Get detailed assignee information"""
         assignees = []
-        if task._assign:
-            assigned_users = frappe.parse_json(task._assign)
-            for user in assigned_users:
+        for user in TaskService.parse_assign(task):
+            if user_map is not None:
+                user_info = user_map.get(user)
+            else:
                 user_info = frappe.get_cached_value(
                     "User",
                     user,
                     ["full_name", "user_image"],
                     as_dict=True
                 )
-                if user_info:
-                    assignees.append({
-                        "id": user,
-                        "name": user_info.full_name,
-                        "image": user_info.user_image
-                    })
+            if user_info:
+                assignees.append({
+                    "id": user,
+                    "name": user_info.full_name,
+                    "image": user_info.user_image
+                })
         return assignees
 
     @staticmethod
-    def get_primary_assignee(task):
+    def get_primary_assignee(task, user_map=None):
         """Get the primary assignee from _assign field"""
         try:
-            if task._assign:
-                assigned_users = frappe.parse_json(task._assign)
-                if assigned_users and len(assigned_users) > 0:
-                    assignee = assigned_users[0]
-                    if frappe.db.exists("User", assignee):
-                        return assignee
-                    frappe.logger().warning(f"Invalid user {assignee} assigned to task {task.name}")
+            assigned_users = TaskService.parse_assign(task)
+            if assigned_users:
+                assignee = assigned_users[0]
+                if user_map is not None:
+                    user_exists = assignee in user_map
+                else:
+                    user_exists = frappe.db.exists("User", assignee)
+                if user_exists:
+                    return assignee
+                frappe.logger().warning(f"Invalid user {assignee} assigned to task {task.name}")
         except Exception as e:
             frappe.logger().error(f"Error getting primary assignee for task {task.name}: {str(e)}")
         return "unassigned"
 
     @staticmethod
-    def format_task(task):
-        """Format task for API response"""
+    def format_task(task, user_map=None):
+        """Format task for API response
+
+        Pass a ``user_map`` from ``get_user_map`` to resolve assignees without
+        per-task User lookups (see ``format_tasks``).
+        """
         try:
             # Get primary assignee with fallback
             try:
-                assignee = TaskService.get_primary_assignee(task)
+                assignee = TaskService.get_primary_assignee(task, user_map)
             except Exception as e:
                 frappe.logger().error(f"Error getting primary assignee: {str(e)}")
                 assignee = "unassigned"
@@ -78,7 +137,7 @@ class TaskService:
 
             # Get assignees list with fallback
             try:
-                assignees = TaskService.get_task_assignees(task)
+                assignees = TaskService.get_task_assignees(task, user_map)
             except Exception as e:
                 frappe.logger().error(f"Error getting task assignees: {str(e)}")
                 assignees = []
@@ -133,6 +192,28 @@ class TaskService:
                 "modified": task.modified if hasattr(task, 'modified') else None
             }
 
+    @staticmethod
+    def format_tasks(tasks):
+        """Format a whole row set, resolving every referenced user once"""
+        users = set()
+        for task in tasks:
+            try:
+                users.update(TaskService.parse_assign(task))
+            except Exception as e:
+                frappe.logger().error(f"Error parsing assignees for task {task.name}: {str(e)}")
+
+        user_map = TaskService.get_user_map(users)
+
+        formatted_tasks = []
+        for task in tasks:
+            try:
+                formatted_tasks.append(TaskService.format_task(task, user_map))
+            except Exception as format_error:
+                frappe.logger().error(f"Error formatting task {task.name}: {str(format_error)}")
+                continue
+
+        return formatted_tasks
+
     @staticmethod
     def is_task_overdue(task):
         """Check if task is overdue"""
@@ -153,13 +234,8 @@ class TaskService:
         task = frappe.get_doc("Task", task_id)
         
         # Validate updates
-        valid_fields = [
-            "status", "priority", "exp_start_date",
-            "exp_end_date", "expected_time", "description"
-        ]
-        
         for field, value in updates.items():
-            if field not in valid_fields:
+            if field not in VALID_FIELDS:
                 frappe.throw(_(f"Invalid field: {field}"))
             
             setattr(task, field, value)
@@ -173,54 +249,174 @@ class TaskService:
         return TaskService.format_task(task)
 
     @staticmethod
-    def batch_update_tasks(updates, user=None):
-        """Update multiple tasks in batch with validation"""
+    def has_write_permission(row, user):
+        """Document-level write check on a Task row loaded without a full get_doc"""
+        return frappe.has_permission("Task", "write", doc=frappe._dict(row, doctype="Task"), user=user)
+
+    @staticmethod
+    def get_select_options(fieldname):
+        """Options of a Task Select field, from the (cached) DocType meta"""
+        options = frappe.get_meta("Task").get_options(fieldname) or ""
+        return [option for option in options.split("\n") if option]
+
+    @staticmethod
+    def validate_changes(row, changes):
+        """Validate planner changes against a Task row in memory, returning cleaned values"""
+        cleaned = {}
+        for field, value in changes.items():
+            if field not in VALID_FIELDS:
+                raise frappe.ValidationError(_("Invalid field: {0}").format(field))
+
+            if field in ("exp_start_date", "exp_end_date"):
+                value = getdate(value) if value else None
+            elif field == "expected_time":
+                value = flt(value)
+            cleaned[field] = value
+
+        # Only the values being changed are checked, against the Task field options
+        for field in ("status", "priority"):
+            if field in cleaned and cleaned[field] not in TaskService.get_select_options(field):
+                raise frappe.ValidationError(_("Invalid task {0}").format(field))
+
+        start_date = cleaned.get("exp_start_date", row.exp_start_date)
+        end_date = cleaned.get("exp_end_date", row.exp_end_date)
+        if start_date and end_date and getdate(end_date) < getdate(start_date):
+            raise frappe.ValidationError(_("End date cannot be before start date"))
+
+        return cleaned
+
+    @staticmethod
+    def apply_bulk_changes(changes_by_task, modified):
+        """Write {task: {field: value}} with one CASE-based UPDATE per field and chunk"""
+        fields = {}
+        for task_id, changes in changes_by_task.items():
+            for field, value in changes.items():
+                fields.setdefault(field, []).append((task_id, value))
+
+        for field, assignments in fields.items():
+            for i in range(0, len(assignments), BULK_UPDATE_CHUNK_SIZE):
+                chunk = assignments[i:i + BULK_UPDATE_CHUNK_SIZE]
+                params = []
+                for task_id, value in chunk:
+                    params.extend([task_id, value])
+                params.extend([modified, frappe.session.user])
+                params.extend(task_id for task_id, _value in chunk)
+
+                frappe.db.sql("""
+                    UPDATE `tabTask`
+                    SET `{field}` = CASE name {cases} END,
+                        modified = %s,
+                        modified_by = %s
+                    WHERE name IN ({names})
+                """.format(
+                    field=field,
+                    cases=" ".join("WHEN %s THEN %s" for _chunk in chunk),
+                    names=", ".join(["%s"] * len(chunk))
+                ), params)
+
+    @staticmethod
+    def bulk_update_tasks(updates, user=None):
+        """Apply many task updates in one transaction
+
+        Rows are loaded with one query and validated in memory; valid changes
+        are written with batched UPDATE statements and a single commit.
+        Returns ``{"updated": [formatted tasks], "failed": [{"task_id", "error"}]}``.
+        """
         if not updates:
             frappe.throw(_("No updates provided"))
         
         # Authorization check
         if user and not frappe.has_permission("Task", "write", user=user):
             frappe.throw(_("Not authorized to update tasks"), frappe.PermissionError)
-        
-        updated_tasks = []
-        
+
+        task_ids = [update.get("task_id") for update in updates if update.get("task_id")]
+        rows = {
+            row.name: row
+            for row in frappe.get_all(
+                "Task",
+                filters={"name": ["in", task_ids]},
+                fields=TASK_FIELDS
+            )
+        } if task_ids else {}
+
+        failed = []
+        changes_by_task = {}
         for update in updates:
             task_id = update.get("task_id")
             changes = update.get("changes", {})
             
             if not task_id or not changes:
                 continue
-            
-            try:
-                task = frappe.get_doc("Task", task_id)
-
-                # Debug logging for batch update
-                frappe.logger().info(f"batch_update_tasks: Updating task {task_id} with changes {changes}")
-                
-                for field, value in changes.items():
-                    if hasattr(task, field):
-                        setattr(task, field, value)
-                
-                task.modified = now_datetime()
-                task.save()
-                frappe.db.commit()
-                updated_tasks.append(task)
-            except Exception as e:
-                frappe.logger().error(f"Error updating task {task_id}: {str(e)}")
+
+            row = rows.get(task_id)
+            if not row:
+                failed.append({"task_id": task_id, "error": _("Task {0} not found").format(task_id)})
                 continue
-        
-        # Emit batch update
-        if updated_tasks:
+
+            if user and not TaskService.has_write_permission(row, user):
+                failed.append({"task_id": task_id, "error": _("Not permitted to update task {0}").format(task_id)})
+                continue
+
+            try:
+                cleaned = TaskService.validate_changes(row, {**changes_by_task.get(task_id, {}), **changes})
+                changes_by_task[task_id] = cleaned
+            except frappe.ValidationError as e:
+                failed.append({"task_id": task_id, "error": str(e)})
+
+        if not changes_by_task:
+            return {"updated": [], "failed": failed}
+
+        modified = now_datetime()
+        updated_tasks = []
+        for task_id, changes in changes_by_task.items():
+            row = rows[task_id]
+            row.update(changes)
+            row.modified = modified
+            updated_tasks.append(row)
+
+        try:
+            TaskService.apply_bulk_changes(changes_by_task, modified)
+            # Queued before the commit so the buffer is flushed by it
             emit_batch_update(updated_tasks)
-        
-        # Debug logging for batch update result
-        frappe.logger().info(f"batch_update_tasks: Updated tasks count {len(updated_tasks)}")
-        
-        return [TaskService.format_task(task) for task in updated_tasks]
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.logger().error(f"Error applying bulk task update: {str(e)}")
+            failed.extend({"task_id": task_id, "error": str(e)} for task_id in changes_by_task)
+            return {"updated": [], "failed": failed}
+
+        # Bulk UPDATEs bypass doc_events, so invalidate caches here
+        from ..cache import clear_task_cache
+        for department in {row.department for row in updated_tasks if row.department}:
+            clear_task_cache(department)
+        clear_task_cache()
+
+        frappe.logger().info(f"bulk_update_tasks: Updated {len(updated_tasks)} tasks, {len(failed)} failed")
+
+        return {
+            "updated": TaskService.format_tasks(updated_tasks),
+            "failed": failed
+        }
 
     @staticmethod
-    def move_task(task_id, assignee_id=None, start_date=None, end_date=None, user=None):
-        """Move task to different assignee or schedule with validation"""
+    def batch_update_tasks(updates, user=None):
+        """Update multiple tasks in batch with validation"""
+        return TaskService.bulk_update_tasks(updates, user=user)["updated"]
+
+    @staticmethod
+    def move_task(task_id, assignee_id=None, start_date=None, end_date=None, user=None,
+                  modified=None, keep_missing_dates=False, allow_overlap=True):
+        """Move task to different assignee or schedule with validation
+
+        Uses a single UPDATE guarded by the row's ``modified`` timestamp
+        instead of a full document save. ``modified`` is the version the
+        client last saw; when the row changed since, nothing is written and
+        a conflict is returned together with the current task.
+
+        With ``allow_overlap`` unset the move is refused when the assignee
+        already has tasks scheduled in the target slot; the check is skipped
+        otherwise so the default move stays a single indexed write.
+        """
         if not task_id:
             frappe.throw(_("Task ID is required"))
         
@@ -228,97 +424,515 @@ class TaskService:
         if user and not frappe.has_permission("Task", "write", user=user):
             frappe.throw(_("Not authorized to move tasks"), frappe.PermissionError)
         
-        task = frappe.get_doc("Task", task_id)
+        row = frappe.db.get_value("Task", task_id, TASK_FIELDS, as_dict=True)
+        if not row:
+            raise frappe.DoesNotExistError(_("Task {0} not found").format(task_id))
+        if user and not TaskService.has_write_permission(row, user):
+            frappe.throw(_("Not permitted to move task {0}").format(task_id), frappe.PermissionError)
+
+        expected_modified = get_datetime(modified) if modified else row.modified
+        if get_datetime(row.modified) != expected_modified:
+            return TaskService._move_conflict(row)
+
+        changes = {}
         
         # Update assignment
         if assignee_id:
             if assignee_id == "unassigned":
-                task._assign = None
+                changes["_assign"] = None
             else:
                 # Get employee record to validate
                 employee = frappe.get_value("Employee", {"user_id": assignee_id}, "name")
                 if employee:
-                    task._assign = frappe.as_json([assignee_id])
+                    changes["_assign"] = frappe.as_json([assignee_id])
                 else:
                     frappe.throw(_("Invalid assignee"))
         
         # Update schedule
-        if start_date:
-            # Convert to string in ISO format to ensure consistency
-            if isinstance(start_date, str):
-                task.exp_start_date = getdate(start_date)
-            else:
-                task.exp_start_date = start_date.strftime("%Y-%m-%d")
-        else:
-            task.exp_start_date = None
-            
-        if end_date:
-            if isinstance(end_date, str):
-                task.exp_end_date = getdate(end_date)
-            else:
-                task.exp_end_date = end_date.strftime("%Y-%m-%d")
-        else:
-            task.exp_end_date = None
-        
-        task.modified = now_datetime()
-        try:
-            task.save()
-            frappe.db.commit()
-        except frappe.TimestampMismatchError:
-            # Reload and retry save to handle concurrent modification
-            task.reload()
-            task.save()
-            frappe.db.commit()
+        if start_date or not keep_missing_dates:
+            changes["exp_start_date"] = getdate(start_date) if start_date else None
+        if end_date or not keep_missing_dates:
+            changes["exp_end_date"] = getdate(end_date) if end_date else None
+
+        start = changes.get("exp_start_date", row.exp_start_date)
+        end = changes.get("exp_end_date", row.exp_end_date)
+        if start and end and getdate(end) < getdate(start):
+            frappe.throw(_("End date cannot be before start date"))
+
+        if not allow_overlap:
+            from .workload_service import WorkloadService
+            assign = changes.get("_assign", row._assign)
+            assigned_users = frappe.parse_json(assign) if assign else []
+            overlapping = WorkloadService.get_slot_conflicts(
+                assigned_users[0] if assigned_users else None, start, end, exclude=task_id
+            )
+            if overlapping:
+                frappe.throw(_("Slot is not free: overlaps {0}").format(", ".join(overlapping)))
+
+        now = now_datetime()
+        values = {**changes, "name": task_id, "expected": expected_modified, "now": now, "user": frappe.session.user}
+        frappe.db.sql("""
+            UPDATE `tabTask`
+            SET {sets}modified = %(now)s, modified_by = %(user)s
+            WHERE name = %(name)s AND modified = %(expected)s
+        """.format(sets="".join(f"`{field}` = %({field})s, " for field in changes)), values)
+
+        if not frappe.db._cursor.rowcount:
+            # Lost the race against a concurrent save
+            return TaskService._move_conflict(
+                frappe.db.get_value("Task", task_id, TASK_FIELDS, as_dict=True) or row
+            )
+
+        row.update(changes)
+        row.modified = now
+
+        # Emit real-time update, queued before the commit so the buffer is flushed by it
+        emit_task_update(row)
+
+        frappe.db.commit()
 
         # Debug logging for move_task
-        frappe.logger().info(f"move_task: Updated task {task.name} with start_date={task.exp_start_date} end_date={task.exp_end_date} assignee={task._assign}")
+        frappe.logger().info(f"move_task: Updated task {task_id} with start_date={row.exp_start_date} end_date={row.exp_end_date} assignee={row._assign}")
 
-        # Emit real-time update
-        emit_task_update(task)
+        # The conditional UPDATE bypasses doc_events, so invalidate caches here
+        from ..cache import clear_task_cache
+        if row.department:
+            clear_task_cache(row.department)
+        clear_task_cache()
         
         return {
             "success": True,
-            "task": TaskService.format_task(task),
+            "task": TaskService.format_task(row),
             "message": "Task moved successfully"
         }
 
     @staticmethod
-    def get_all_tasks(department=None, start_date=None, end_date=None):
-        """Get all tasks with filtering and formatting"""
-        try:
-            filters = {
-                "status": ["in", ["Open", "Working", "Completed", "Overdue"]]
+    def move_tasks(moves, user=None, keep_missing_dates=True):
+        """Apply several task moves atomically
+
+        ``moves`` is a list of ``{task_id, assignee_id, start_date, end_date,
+        modified}`` dicts. Rows are locked and loaded with one query,
+        assignees validated with one Employee query, and every move is
+        written in a single transaction; if any move is invalid or stale,
+        nothing is written.
+        """
+        if not moves:
+            frappe.throw(_("No moves provided"))
+
+        # Authorization check
+        if user and not frappe.has_permission("Task", "write", user=user):
+            frappe.throw(_("Not authorized to move tasks"), frappe.PermissionError)
+
+        task_ids = [move.get("task_id") for move in moves if move.get("task_id")]
+        rows = {
+            row.name: row
+            for row in frappe.db.sql("""
+                SELECT {fields}
+                FROM `tabTask`
+                WHERE name IN %(names)s
+                FOR UPDATE
+            """.format(fields=", ".join(f"`{field}`" for field in TASK_FIELDS)),
+            {"names": tuple(task_ids)}, as_dict=True)
+        } if task_ids else {}
+
+        assignee_ids = {
+            move.get("assignee_id") for move in moves
+            if move.get("assignee_id") and move.get("assignee_id") != "unassigned"
+        }
+        valid_assignees = set(frappe.get_all(
+            "Employee",
+            filters={"user_id": ["in", list(assignee_ids)]},
+            pluck="user_id"
+        )) if assignee_ids else set()
+
+        errors = []
+        conflicts = []
+        changes_by_task = {}
+        for move in moves:
+            task_id = move.get("task_id")
+            row = rows.get(task_id)
+            if not row:
+                errors.append({"task_id": task_id, "error": _("Task {0} not found").format(task_id)})
+                continue
+
+            if user and not TaskService.has_write_permission(row, user):
+                errors.append({"task_id": task_id, "error": _("Not permitted to move task {0}").format(task_id)})
+                continue
+
+            if move.get("modified") and get_datetime(move["modified"]) != get_datetime(row.modified):
+                conflicts.append(TaskService.format_task(row))
+                continue
+
+            changes = {}
+            assignee_id = move.get("assignee_id")
+            if assignee_id == "unassigned":
+                changes["_assign"] = None
+            elif assignee_id:
+                if assignee_id not in valid_assignees:
+                    errors.append({"task_id": task_id, "error": _("Invalid assignee")})
+                    continue
+                changes["_assign"] = frappe.as_json([assignee_id])
+
+            start_date = move.get("start_date")
+            end_date = move.get("end_date")
+            if start_date or not keep_missing_dates:
+                changes["exp_start_date"] = getdate(start_date) if start_date else None
+            if end_date or not keep_missing_dates:
+                changes["exp_end_date"] = getdate(end_date) if end_date else None
+
+            start = changes.get("exp_start_date", row.exp_start_date)
+            end = changes.get("exp_end_date", row.exp_end_date)
+            if start and end and getdate(end) < getdate(start):
+                errors.append({"task_id": task_id, "error": _("End date cannot be before start date")})
+                continue
+
+            if changes:
+                changes_by_task[task_id] = changes
+
+        if errors or conflicts:
+            frappe.db.rollback()
+            return {
+                "success": False,
+                "errors": errors,
+                "conflicts": conflicts,
+                "tasks": []
             }
-            
-            if department:
-                if not frappe.db.exists("Department", department):
-                    frappe.logger().warning(f"Department {department} not found")
-                else:
-                    filters["department"] = department
-            
-            tasks = frappe.get_all(
-                "Task",
-                filters=filters,
-                fields=[
-                    "name", "subject", "status", "priority", "project",
-                    "exp_start_date", "exp_end_date", "expected_time",
-                    "department", "description", "color", "type",
-                    "_assign", "_comments", "_seen", "creation",
-                    "modified", "owner"
-                ],
-                order_by="creation desc"
+
+        modified = now_datetime()
+        moved_tasks = []
+        for task_id, changes in changes_by_task.items():
+            row = rows[task_id]
+            row.update(changes)
+            row.modified = modified
+            moved_tasks.append(row)
+
+        if changes_by_task:
+            TaskService.apply_bulk_changes(changes_by_task, modified)
+        # Queued in the request buffer before the commit, which publishes it
+        # as one batch_task_update
+        emit_batch_update(moved_tasks)
+        frappe.db.commit()
+
+        # Bulk UPDATEs bypass doc_events, so invalidate caches here
+        from ..cache import clear_task_cache
+        for department in {row.department for row in moved_tasks if row.department}:
+            clear_task_cache(department)
+        clear_task_cache()
+
+        return {
+            "success": True,
+            "errors": [],
+            "conflicts": [],
+            "tasks": TaskService.format_tasks(moved_tasks)
+        }
+
+    @staticmethod
+    def _move_conflict(row):
+        """Response for a move that lost against a concurrent change"""
+        return {
+            "success": False,
+            "conflict": True,
+            "task": TaskService.format_task(row),
+            "message": _("Task was changed by someone else, please retry")
+        }
+
+    @staticmethod
+    def get_task_conditions(department=None, start_date=None, end_date=None, include_unscheduled=True):
+        """Build SQL conditions for the planner task window
+
+        Scheduled tasks are kept when their [exp_start_date, exp_end_date]
+        interval overlaps the requested window. Tasks missing either date are
+        only returned when ``include_unscheduled`` is set.
+        """
+        conditions = ["status in %(statuses)s"]
+        values = {"statuses": ACTIVE_STATUSES}
+
+        if department:
+            if not frappe.db.exists("Department", department):
+                frappe.logger().warning(f"Department {department} not found")
+            else:
+                conditions.append("department = %(department)s")
+                values["department"] = department
+
+        if start_date or end_date:
+            overlap = ["exp_start_date IS NOT NULL", "exp_end_date IS NOT NULL"]
+            if end_date:
+                overlap.append("exp_start_date <= %(end_date)s")
+                values["end_date"] = getdate(end_date)
+            if start_date:
+                overlap.append("exp_end_date >= %(start_date)s")
+                values["start_date"] = getdate(start_date)
+
+            window = "({0})".format(" AND ".join(overlap))
+            if include_unscheduled:
+                window = f"({window} OR exp_start_date IS NULL OR exp_end_date IS NULL)"
+            conditions.append(window)
+        elif not include_unscheduled:
+            conditions.append("exp_start_date IS NOT NULL AND exp_end_date IS NOT NULL")
+
+        return conditions, values
+
+    @staticmethod
+    def get_search_conditions(searchtext=None, project=None):
+        """SQL conditions and rank expression for a backlog search
+
+        Words long enough to be in the FULLTEXT index become required prefix
+        terms of a boolean-mode MATCH, which also ranks the results. Shorter
+        words only narrow those matches; on their own they fall back to a
+        subject prefix match. The project filter is a prefix match as well so
+        it can use the project index.
+        """
+        conditions = []
+        values = {}
+        score = "0"
+
+        tokens = re.findall(r"\w+", searchtext or "")
+        indexed = [token for token in tokens if len(token) >= SEARCH_MIN_TOKEN_SIZE]
+        short = [token for token in tokens if len(token) < SEARCH_MIN_TOKEN_SIZE]
+
+        if indexed:
+            values["search"] = " ".join(f"+{token}*" for token in indexed)
+            score = "MATCH(subject, project, description) AGAINST (%(search)s IN BOOLEAN MODE)"
+            conditions.append(score)
+
+        for i, token in enumerate(short):
+            token = token.replace("_", "\\_")
+            values[f"search_{i}"] = f"%{token}%" if indexed else f"{token}%"
+            conditions.append(f"subject LIKE %(search_{i})s")
+
+        if project:
+            values["project"] = project.replace("%", "\\%").replace("_", "\\_") + "%"
+            conditions.append("project LIKE %(project)s")
+
+        return conditions, values, score
+
+    @staticmethod
+    def search_tasks(fields, conditions, values, score="0", start=0, page_length=None):
+        """Fetch one page of Task rows ranked by score, newest first on ties
+
+        Returns ``(rows, has_more)``.
+        """
+        page_length = min(cint(page_length) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        values = {**values, "start": cint(start), "page_limit": page_length + 1}
+
+        rows = frappe.db.sql("""
+            SELECT {fields}, {score} AS search_score
+            FROM `tabTask`
+            {where}
+            ORDER BY search_score DESC, creation DESC
+            LIMIT %(page_limit)s OFFSET %(start)s
+        """.format(
+            fields=", ".join(f"`{field}`" for field in fields),
+            score=score,
+            where=f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        ), values, as_dict=True)
+
+        has_more = len(rows) > page_length
+        return rows[:page_length], has_more
+
+    @staticmethod
+    def get_task_summary(department=None, start_date=None, end_date=None):
+        """Count total, scheduled and unscheduled planner tasks with one query"""
+        conditions, values = TaskService.get_task_conditions(department, start_date, end_date)
+        summary = frappe.db.sql("""
+            SELECT
+                COUNT(*) AS total_tasks,
+                COALESCE(SUM(exp_start_date IS NOT NULL AND exp_end_date IS NOT NULL), 0) AS scheduled_tasks
+            FROM `tabTask`
+            WHERE {conditions}
+        """.format(conditions=" AND ".join(conditions)), values, as_dict=True)[0]
+
+        return {
+            "total_tasks": cint(summary.total_tasks),
+            "scheduled_tasks": cint(summary.scheduled_tasks),
+            "unscheduled_tasks": cint(summary.total_tasks) - cint(summary.scheduled_tasks)
+        }
+
+    @staticmethod
+    def get_assignee_load(department=None, start_date=None, end_date=None):
+        """Sum scheduled hours and task counts per primary assignee (first user in _assign)
+
+        The planner writes ``_assign`` directly without ToDo rows, so the
+        primary assignee is read from the JSON field, matching the assignee
+        ``format_task`` reports.
+        """
+        conditions, values = TaskService.get_task_conditions(
+            department, start_date, end_date, include_unscheduled=False
+        )
+        rows = frappe.db.sql("""
+            SELECT
+                task.assignee,
+                SUM(COALESCE(task.expected_time, 0)) AS scheduled_hours,
+                COUNT(*) AS task_count
+            FROM (
+                SELECT
+                    expected_time,
+                    JSON_UNQUOTE(JSON_EXTRACT(_assign, '$[0]')) AS assignee
+                FROM `tabTask`
+                WHERE {conditions}
+                AND _assign LIKE '[%%'
+            ) task
+            WHERE task.assignee IS NOT NULL
+            GROUP BY task.assignee
+        """.format(conditions=" AND ".join(conditions)), values, as_dict=True)
+
+        return {
+            row.assignee: {
+                "scheduled_hours": flt(row.scheduled_hours),
+                "task_count": cint(row.task_count)
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def get_task_stats(department=None):
+        """Compute dashboard task statistics with GROUP BY queries"""
+        conditions, values = TaskService.get_task_conditions(department)
+        where = " AND ".join(conditions)
+
+        counts = frappe.db.sql("""
+            SELECT status, priority, COUNT(*) AS count
+            FROM `tabTask`
+            WHERE {where}
+            GROUP BY status, priority
+        """.format(where=where), values, as_dict=True)
+
+        overdue = frappe.db.sql("""
+            SELECT COUNT(*)
+            FROM `tabTask`
+            WHERE {where}
+            AND status != 'Completed'
+            AND exp_end_date < CURDATE()
+        """.format(where=where), values)[0][0]
+
+        by_status = {}
+        by_priority = {}
+        for row in counts:
+            by_status[row.status] = by_status.get(row.status, 0) + row.count
+            by_priority[row.priority] = by_priority.get(row.priority, 0) + row.count
+
+        return {
+            'total': sum(by_status.values()),
+            'completed': by_status.get('Completed', 0),
+            'in_progress': by_status.get('Working', 0),
+            'overdue': cint(overdue),
+            'by_priority': {
+                'high': by_priority.get('High', 0),
+                'medium': by_priority.get('Medium', 0),
+                'low': by_priority.get('Low', 0)
+            },
+            'last_updated': str(now_datetime())
+        }
+
+    @staticmethod
+    def encode_cursor(row):
+        """Encode the (creation, name) keyset position of a row as an opaque cursor"""
+        payload = json.dumps([str(row.creation), row.name])
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor produced by encode_cursor into (creation, name)"""
+        try:
+            creation, name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return get_datetime(creation), name
+        except Exception:
+            frappe.throw(_("Invalid cursor"))
+
+    @staticmethod
+    def fetch_task_page(fields, conditions=None, values=None, cursor=None, page_size=None):
+        """Fetch one page of Task rows ordered by (creation, name) descending
+
+        Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+        """
+        page_size = min(cint(page_size) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        conditions = list(conditions or [])
+        values = dict(values or {})
+
+        if cursor:
+            values["cursor_creation"], values["cursor_name"] = TaskService.decode_cursor(cursor)
+            conditions.append(
+                "(creation < %(cursor_creation)s"
+                " OR (creation = %(cursor_creation)s AND name < %(cursor_name)s))"
             )
-            
-            formatted_tasks = []
-            for task in tasks:
-                try:
-                    formatted_task = TaskService.format_task(task)
-                    formatted_tasks.append(formatted_task)
-                except Exception as format_error:
-                    frappe.logger().error(f"Error formatting task {task.name}: {str(format_error)}")
-                    continue
-            
-            return formatted_tasks
+
+        values["page_limit"] = page_size + 1
+        rows = frappe.db.sql(
+            """
+            SELECT {fields}
+            FROM `tabTask`
+            {where}
+            ORDER BY creation DESC, name DESC
+            LIMIT %(page_limit)s
+            """.format(
+                fields=", ".join(f"`{field}`" for field in fields),
+                where=f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            ),
+            values,
+            as_dict=True
+        )
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = TaskService.encode_cursor(rows[-1])
+
+        return rows, next_cursor
+
+    @staticmethod
+    def count_tasks(conditions=None, values=None):
+        """Number of Task rows matching SQL conditions"""
+        return frappe.db.sql("""
+            SELECT COUNT(*)
+            FROM `tabTask`
+            {where}
+        """.format(where=f"WHERE {' AND '.join(conditions)}" if conditions else ""), values or {})[0][0]
+
+    @staticmethod
+    def get_tasks_page(department=None, start_date=None, end_date=None,
+                       include_unscheduled=True, cursor=None, page_size=None):
+        """Get one formatted page of planner tasks plus the cursor for the next page
+
+        ``total_count`` is the number of tasks matching the filters; it is
+        counted on the first page only and is None on later pages.
+        """
+        conditions, values = TaskService.get_task_conditions(
+            department, start_date, end_date, include_unscheduled
+        )
+        rows, next_cursor = TaskService.fetch_task_page(
+            TASK_FIELDS, conditions, values, cursor, page_size
+        )
+        return {
+            "tasks": TaskService.format_tasks(rows),
+            "next_cursor": next_cursor,
+            "total_count": None if cursor else TaskService.count_tasks(conditions, values)
+        }
+
+    @staticmethod
+    def iter_all_tasks(department=None, start_date=None, end_date=None,
+                       include_unscheduled=True, page_size=None):
+        """Yield formatted planner tasks page by page
+
+        Only one page is held in memory at a time, which keeps consumers
+        bounded by ``page_size`` rather than the Task table size.
+        """
+        conditions, values = TaskService.get_task_conditions(
+            department, start_date, end_date, include_unscheduled
+        )
+        cursor = None
+        while True:
+            rows, cursor = TaskService.fetch_task_page(TASK_FIELDS, conditions, values, cursor, page_size)
+            yield from TaskService.format_tasks(rows)
+            if not cursor:
+                break
+
+    @staticmethod
+    def get_all_tasks(department=None, start_date=None, end_date=None, include_unscheduled=True):
+        """Get all tasks with filtering and formatting"""
+        try:
+            return list(TaskService.iter_all_tasks(
+                department, start_date, end_date, include_unscheduled, page_size=MAX_PAGE_SIZE
+            ))
             
         except Exception as e:
             frappe.logger().error(f"Error in get_all_tasks: {str(e)}")
@@ -0,0 +1,35 @@
+from collections import defaultdict
+
+
+class WorkloadSnapshot:
+    """Formatted workload data indexed by assignee
+
+    Build it from a ``get_workload_data`` payload and look tasks up per
+    assignee instead of filtering the full task list for each one.
+    """
+
+    def __init__(self, workload_data):
+        self.assignees = workload_data.get("assignees", [])
+        self.tasks = workload_data.get("tasks", [])
+        self.capacity_settings = workload_data.get("capacity_settings", {})
+
+        self.by_assignee = defaultdict(list)
+        for task in self.tasks:
+            self.by_assignee[task.get("assignee")].append(task)
+
+    def tasks_for_assignee(self, assignee_id, scheduled_only=False):
+        tasks = self.by_assignee.get(assignee_id, [])
+        if scheduled_only:
+            return [task for task in tasks if task.get("isScheduled")]
+        return tasks
+
+    def to_legacy_planner_tasks(self):
+        """Group tasks per assignee in the legacy get_planner_tasks format"""
+        employees_dict = {}
+        for assignee in self.assignees:
+            employees_dict[assignee["id"]] = {
+                "id": assignee["id"],
+                "name": assignee["name"],
+                "tasks": self.tasks_for_assignee(assignee["id"])
+            }
+        return list(employees_dict.values())
@@ -0,0 +1,128 @@
+import base64
+import json
+from datetime import datetime
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+TOMBSTONE_KEY = 'planner_tombstones_{department}'
+TOMBSTONE_RETENTION = 7 * 86400  # seconds a deletion is remembered
+CHANGES_PAGE_SIZE = 2000
+
+def _tombstone_key(department):
+    return frappe.cache().make_key(TOMBSTONE_KEY.format(department=department or 'all'))
+
+def record_tombstone(task_name, department=None):
+    """Remember that a task left a department board (deleted or moved away)"""
+    now = now_datetime().timestamp()
+    cache = frappe.cache()
+
+    for key in {_tombstone_key(department), _tombstone_key(None)}:
+        cache.zadd(key, {task_name: now})
+        cache.zremrangebyscore(key, '-inf', now - TOMBSTONE_RETENTION)
+        cache.expire(key, TOMBSTONE_RETENTION)
+
+def get_tombstones(department, since, until=None):
+    """Tasks removed from a department board in the (since, until] timestamp range
+
+    Returns ``(tombstones, complete)``; ``complete`` is False when ``since``
+    is older than the retention window and the client has to reload fully.
+    """
+    complete = since >= now_datetime().timestamp() - TOMBSTONE_RETENTION
+
+    entries = frappe.cache().zrangebyscore(
+        _tombstone_key(department), f'({since}', '+inf' if until is None else until, withscores=True
+    )
+    return [(frappe.safe_decode(name), score) for name, score in entries], complete
+
+def encode_watermark(modified, name=''):
+    """Opaque sync cursor over (modified, name), so rows sharing a modified are not skipped"""
+    return base64.urlsafe_b64encode(json.dumps([str(modified), name]).encode()).decode()
+
+def decode_watermark(watermark):
+    """Return (modified, name); a plain timestamp from older clients starts at that instant"""
+    try:
+        modified, name = json.loads(base64.urlsafe_b64decode(watermark.encode()))
+        return get_datetime(modified), name
+    except Exception:
+        return get_datetime(watermark), ''
+
+def on_task_trash(doc, method=None):
+    """doc_events handler: log deleted tasks for delta sync"""
+    try:
+        record_tombstone(doc.name, doc.get('department'))
+    except Exception as e:
+        frappe.logger().error(f"Error recording tombstone for task {doc.name}: {str(e)}")
+
+def on_task_update(doc, method=None):
+    """doc_events handler: log tasks moved to another department"""
+    try:
+        previous = doc.get_doc_before_save()
+        if previous and previous.get('department') and previous.get('department') != doc.get('department'):
+            record_tombstone(doc.name, previous.get('department'))
+    except Exception as e:
+        frappe.logger().error(f"Error recording tombstone for task {doc.name}: {str(e)}")
+
+def get_workload_changes(department=None, since=None):
+    """Task rows changed after a watermark, plus tombstones and the next watermark
+
+    Rows are paged on (modified, name) so a page may end inside a group of
+    rows written by one bulk update. Tombstones are returned on every page,
+    up to the page's watermark, so they are never skipped.
+    """
+    from .services.task_service import TaskService, TASK_FIELDS, ACTIVE_STATUSES
+
+    if not since:
+        return {"full_refresh": True, "tasks": [], "tombstones": [], "watermark": encode_watermark(now_datetime())}
+
+    since, since_name = decode_watermark(since)
+    values = {"since": since, "since_name": since_name, "limit": CHANGES_PAGE_SIZE + 1}
+    conditions = ["(modified > %(since)s OR (modified = %(since)s AND name > %(since_name)s))"]
+    if department:
+        conditions.append("department = %(department)s")
+        values["department"] = department
+
+    rows = frappe.db.sql("""
+        SELECT {fields}
+        FROM `tabTask`
+        WHERE {conditions}
+        ORDER BY modified ASC, name ASC
+        LIMIT %(limit)s
+    """.format(
+        fields=", ".join(f"`{field}`" for field in TASK_FIELDS),
+        conditions=" AND ".join(conditions)
+    ), values, as_dict=True)
+
+    has_more = len(rows) > CHANGES_PAGE_SIZE
+    rows = rows[:CHANGES_PAGE_SIZE]
+
+    active_rows = [row for row in rows if row.status in ACTIVE_STATUSES]
+    tombstones = [row.name for row in rows if row.status not in ACTIVE_STATUSES]
+
+    if rows:
+        watermark_modified, watermark_name = get_datetime(rows[-1].modified), rows[-1].name
+    else:
+        watermark_modified, watermark_name = since, since_name
+
+    # A partial page only covers tombstones up to its last row
+    removed, complete = get_tombstones(
+        department, since.timestamp(), watermark_modified.timestamp() if has_more else None
+    )
+    if not complete:
+        return {"full_refresh": True, "tasks": [], "tombstones": [], "watermark": encode_watermark(now_datetime())}
+
+    changed = {row.name for row in rows}
+    for name, removed_at in removed:
+        if name not in changed:
+            tombstones.append(name)
+        removed_at = datetime.fromtimestamp(removed_at)
+        if removed_at > watermark_modified:
+            watermark_modified, watermark_name = removed_at, ''
+
+    return {
+        "full_refresh": False,
+        "tasks": TaskService.format_tasks(active_rows),
+        "tombstones": tombstones,
+        "watermark": encode_watermark(watermark_modified, watermark_name),
+        "has_more": has_more
+    }
@@ -1,6 +1,16 @@
 import unittest
+from datetime import date, timedelta
+from unittest.mock import patch
+
 import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import getdate, now_datetime
+from planner import sync
+from planner.columnar import encode_tasks
+from planner.services.calendar_service import CalendarService
+from planner.services.dependency_graph import DependencyGraph
+from planner.services.interval_index import IntervalIndex
+from planner.services.schedule_service import ScheduleService
 from planner.services.task_service import TaskService
 from planner.services.workload_service import WorkloadService
 
@@ -18,7 +28,7 @@ class TestPlannerBase(FrappeTestCase):
     def clear_test_data(cls):
         """Clear any existing test data"""
         try:
-            frappe.db.sql("""DELETE FROM `tabTask` WHERE name = 'TEST-TASK-001'""")
+            frappe.db.sql("""DELETE FROM `tabTask` WHERE name LIKE 'TEST-TASK-%'""")
             frappe.db.sql("""DELETE FROM `tabEmployee` WHERE employee_number = 'TEST-EMP-001'""")
             frappe.db.sql("""DELETE FROM `tabDepartment` WHERE name LIKE 'Test Department%'""")
             frappe.db.sql("""DELETE FROM `tabUser` WHERE name = 'test.employee@example.com'""")
@@ -97,6 +107,19 @@ class TestPlannerAPICritical(TestPlannerBase):
             frappe.log_error(f"Error creating test data: {str(e)}")
             raise
 
+    def create_extra_task(self, name, **fields):
+        """Insert another Test Department task (removed by clear_test_data)"""
+        task = frappe.new_doc("Task")
+        task.name = name
+        task.subject = f"Test {name}"
+        task.status = "Open"
+        task.priority = "Medium"
+        task.department = frappe.db.get_value("Department", {"department_name": "Test Department"})
+        task.update(fields)
+        task.insert()
+        frappe.db.commit()
+        return task
+
     def test_task_crud_operations(self):
         """Test critical task operations"""
         try:
@@ -255,6 +278,327 @@ class TestPlannerAPICritical(TestPlannerBase):
             frappe.log_error(f"Error in test_batch_operations: {str(e)}")
             raise
 
+    def test_capacity_bulk_matches_per_employee(self):
+        """The one-pass capacity computation matches the former per-employee queries"""
+        def per_employee(employee_id, start_date, end_date):
+            working_days = WorkloadService.get_working_days(employee_id, start_date, end_date)
+            total_capacity = working_days * 8
+            leave_hours = 0
+            if employee_id != "unassigned":
+                leaves = frappe.get_all(
+                    "Leave Application",
+                    filters={
+                        "employee": ["in", frappe.get_all("Employee", {"user_id": employee_id}, pluck="name")],
+                        "status": "Approved",
+                        "from_date": ["<=", end_date],
+                        "to_date": [">=", start_date]
+                    },
+                    fields=["total_leave_days"]
+                )
+                leave_hours = sum(leave.total_leave_days * 8 for leave in leaves)
+            available_capacity = max(0, total_capacity - leave_hours)
+            return {
+                "total_capacity": total_capacity,
+                "available_capacity": available_capacity,
+                "working_days": working_days,
+                "leave_hours": leave_hours,
+                "availability": (available_capacity / total_capacity * 100) if total_capacity > 0 else 0
+            }
+
+        employee_ids = ["test.employee@example.com", "unassigned"]
+        for start_date, end_date in (("2023-12-01", "2023-12-31"), ("2024-02-26", "2024-03-08")):
+            bulk = WorkloadService.calculate_capacity_bulk(employee_ids, start_date, end_date)
+            for employee_id in employee_ids:
+                self.assertEqual(
+                    bulk[employee_id],
+                    per_employee(employee_id, getdate(start_date), getdate(end_date)),
+                    employee_id
+                )
+
+    def test_sql_aggregates_match_per_task_counts(self):
+        """GROUP BY stats and assignee load match counting the formatted tasks one by one"""
+        dept_name = frappe.db.get_value("Department", {"department_name": "Test Department"})
+        self.create_extra_task(
+            "TEST-TASK-002", status="Working", priority="High", expected_time=8,
+            exp_start_date="2023-12-04", exp_end_date="2023-12-05",
+            _assign=frappe.as_json(["test.employee@example.com"])
+        )
+        self.create_extra_task("TEST-TASK-003", priority="Low", expected_time=4)
+
+        tasks = TaskService.get_all_tasks(dept_name)
+        self.assertEqual(len(tasks), 3)
+
+        stats = TaskService.get_task_stats(dept_name)
+        self.assertEqual(stats["total"], len(tasks))
+        self.assertEqual(stats["completed"], sum(1 for task in tasks if task["status"] == "Completed"))
+        self.assertEqual(stats["in_progress"], sum(1 for task in tasks if task["status"] == "Working"))
+        self.assertEqual(stats["overdue"], sum(
+            1 for task in tasks
+            if task["status"] != "Completed" and task["endDate"] and getdate(task["endDate"]) < getdate()
+        ))
+        self.assertEqual(stats["by_priority"], {
+            priority.lower(): sum(1 for task in tasks if task["priority"] == priority)
+            for priority in ("High", "Medium", "Low")
+        })
+
+        scheduled = [task for task in tasks if task["isScheduled"]]
+        self.assertEqual(TaskService.get_task_summary(dept_name), {
+            "total_tasks": len(tasks),
+            "scheduled_tasks": len(scheduled),
+            "unscheduled_tasks": len(tasks) - len(scheduled)
+        })
+
+        expected_load = {}
+        for task in scheduled:
+            load = expected_load.setdefault(task["assignee"], {"scheduled_hours": 0, "task_count": 0})
+            load["scheduled_hours"] += task["duration"]
+            load["task_count"] += 1
+        self.assertEqual(TaskService.get_assignee_load(dept_name), expected_load)
+
+    def test_task_window_overlap(self):
+        """Tasks overlapping the window are returned; unscheduled ones only on request"""
+        dept_name = frappe.db.get_value("Department", {"department_name": "Test Department"})
+        self.create_extra_task("TEST-TASK-002", exp_start_date="2023-12-10", exp_end_date="2023-12-12")
+        self.create_extra_task("TEST-TASK-003")
+
+        def task_ids(start_date, end_date, include_unscheduled=True):
+            return sorted(
+                task["id"] for task in TaskService.get_all_tasks(
+                    dept_name, start_date, end_date, include_unscheduled
+                )
+            )
+
+        # TEST-TASK-001 runs 2023-12-01 to 2023-12-02
+        self.assertEqual(task_ids("2023-12-02", "2023-12-09"), ["TEST-TASK-001", "TEST-TASK-003"])
+        self.assertEqual(task_ids("2023-12-02", "2023-12-09", False), ["TEST-TASK-001"])
+        # Windows touching a task's first or last day include it
+        self.assertEqual(task_ids("2023-12-03", "2023-12-10", False), ["TEST-TASK-002"])
+        self.assertEqual(task_ids("2023-12-12", "2023-12-31", False), ["TEST-TASK-002"])
+        self.assertEqual(task_ids("2023-12-13", "2023-12-31", False), [])
+        # Open-ended windows
+        self.assertEqual(task_ids(None, "2023-12-05", False), ["TEST-TASK-001"])
+        self.assertEqual(task_ids("2023-12-05", None, False), ["TEST-TASK-002"])
+
+    def test_task_pages_and_generator(self):
+        """Keyset pages cover every task once; total_count comes with the first page"""
+        dept_name = frappe.db.get_value("Department", {"department_name": "Test Department"})
+        self.create_extra_task("TEST-TASK-002")
+        self.create_extra_task("TEST-TASK-003")
+
+        first = TaskService.get_tasks_page(department=dept_name, page_size=2)
+        self.assertEqual(first["total_count"], 3)
+        self.assertEqual(len(first["tasks"]), 2)
+        self.assertTrue(first["next_cursor"])
+
+        second = TaskService.get_tasks_page(department=dept_name, cursor=first["next_cursor"], page_size=2)
+        self.assertIsNone(second["total_count"])
+        self.assertIsNone(second["next_cursor"])
+
+        paged = [task["id"] for task in first["tasks"] + second["tasks"]]
+        streamed = [task["id"] for task in TaskService.iter_all_tasks(department=dept_name, page_size=1)]
+        self.assertEqual(streamed, paged)
+        self.assertEqual(sorted(streamed), ["TEST-TASK-001", "TEST-TASK-002", "TEST-TASK-003"])
+
+    def test_workload_entry_version(self):
+        """The workload ETag version is stable per cache fill and changes on invalidation"""
+        from planner.cache import get_cached_workload_entry, clear_task_cache
+
+        dept_name = frappe.db.get_value("Department", {"department_name": "Test Department"})
+        _data, version = get_cached_workload_entry(dept_name)
+        self.assertEqual(get_cached_workload_entry(dept_name)[1], version)
+
+        clear_task_cache(dept_name)
+        self.assertNotEqual(get_cached_workload_entry(dept_name)[1], version)
+
+    def test_bulk_update_reports_failed_rows(self):
+        """Invalid or missing rows are reported per row while valid ones are written"""
+        self.create_extra_task("TEST-TASK-002")
+
+        result = TaskService.bulk_update_tasks([
+            {"task_id": "TEST-TASK-001", "changes": {"priority": "High"}},
+            {"task_id": "TEST-TASK-002", "changes": {"priority": "Not A Priority"}},
+            {"task_id": "INVALID-TASK", "changes": {"status": "Working"}},
+        ])
+
+        self.assertEqual([task["id"] for task in result["updated"]], ["TEST-TASK-001"])
+        self.assertEqual(sorted(row["task_id"] for row in result["failed"]), ["INVALID-TASK", "TEST-TASK-002"])
+        self.assertEqual(frappe.db.get_value("Task", "TEST-TASK-001", "priority"), "High")
+        self.assertEqual(frappe.db.get_value("Task", "TEST-TASK-002", "priority"), "Medium")
+
+    def test_bulk_update_checks_row_permission(self):
+        """Rows the user may not write are reported as failed and left untouched"""
+        with patch.object(TaskService, "has_write_permission", return_value=False):
+            result = TaskService.bulk_update_tasks(
+                [{"task_id": "TEST-TASK-001", "changes": {"priority": "High"}}],
+                user="test.employee@example.com"
+            )
+
+        self.assertEqual(result["updated"], [])
+        self.assertEqual([row["task_id"] for row in result["failed"]], ["TEST-TASK-001"])
+        self.assertEqual(frappe.db.get_value("Task", "TEST-TASK-001", "priority"), "Medium")
+
+    def test_bulk_update_rolls_back_on_write_error(self):
+        """A failing bulk UPDATE leaves every row as it was"""
+        self.create_extra_task("TEST-TASK-002")
+        apply_bulk_changes = TaskService.apply_bulk_changes
+
+        def fail_after_write(changes_by_task, modified):
+            apply_bulk_changes(changes_by_task, modified)
+            raise Exception("write failed")
+
+        with patch.object(TaskService, "apply_bulk_changes", side_effect=fail_after_write):
+            result = TaskService.bulk_update_tasks([
+                {"task_id": "TEST-TASK-001", "changes": {"status": "Working"}},
+                {"task_id": "TEST-TASK-002", "changes": {"status": "Working"}},
+            ])
+
+        self.assertEqual(result["updated"], [])
+        self.assertEqual(sorted(row["task_id"] for row in result["failed"]), ["TEST-TASK-001", "TEST-TASK-002"])
+        self.assertEqual(frappe.db.get_value("Task", "TEST-TASK-001", "status"), "Open")
+        self.assertEqual(frappe.db.get_value("Task", "TEST-TASK-002", "status"), "Open")
+
+    def test_move_task_conflict_on_stale_modified(self):
+        """A move based on an outdated version is refused with the current task"""
+        from planner.api import move_task
+
+        stale = frappe.db.get_value("Task", "TEST-TASK-001", "modified") - timedelta(seconds=1)
+
+        result = TaskService.move_task(
+            "TEST-TASK-001", None, "2023-12-05", "2023-12-06", modified=str(stale)
+        )
+        self.assertFalse(result["success"])
+        self.assertTrue(result["conflict"])
+        self.assertEqual(str(result["task"]["startDate"]), "2023-12-01")
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-001", "exp_start_date")), "2023-12-01")
+
+        move_task("TEST-TASK-001", start_date="2023-12-05", end_date="2023-12-06", modified=str(stale))
+        self.assertEqual(frappe.local.response.http_status_code, 409)
+
+    def test_move_task_checks_row_permission(self):
+        """A move of a row the user may not write raises before anything is written"""
+        with patch.object(TaskService, "has_write_permission", return_value=False):
+            with self.assertRaises(frappe.PermissionError):
+                TaskService.move_task(
+                    "TEST-TASK-001", None, "2023-12-05", "2023-12-06", user="test.employee@example.com"
+                )
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-001", "exp_start_date")), "2023-12-01")
+
+    def test_move_tasks_all_or_nothing(self):
+        """One invalid move leaves every task of the batch unchanged"""
+        self.create_extra_task("TEST-TASK-002", exp_start_date="2023-12-01", exp_end_date="2023-12-01")
+
+        result = TaskService.move_tasks([
+            {"task_id": "TEST-TASK-001", "start_date": "2023-12-05", "end_date": "2023-12-06"},
+            {"task_id": "TEST-TASK-002", "start_date": "2023-12-08", "end_date": "2023-12-07"},
+        ])
+        self.assertFalse(result["success"])
+        self.assertEqual([row["task_id"] for row in result["errors"]], ["TEST-TASK-002"])
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-001", "exp_start_date")), "2023-12-01")
+
+        with patch.object(TaskService, "has_write_permission", side_effect=lambda row, user: row.name != "TEST-TASK-002"):
+            result = TaskService.move_tasks([
+                {"task_id": "TEST-TASK-001", "start_date": "2023-12-05", "end_date": "2023-12-06"},
+                {"task_id": "TEST-TASK-002", "start_date": "2023-12-07", "end_date": "2023-12-08"},
+            ], user="test.employee@example.com")
+        self.assertFalse(result["success"])
+        self.assertEqual([row["task_id"] for row in result["errors"]], ["TEST-TASK-002"])
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-001", "exp_start_date")), "2023-12-01")
+
+        result = TaskService.move_tasks([
+            {"task_id": "TEST-TASK-001", "start_date": "2023-12-05", "end_date": "2023-12-06"},
+            {"task_id": "TEST-TASK-002", "start_date": "2023-12-07", "end_date": "2023-12-08"},
+        ])
+        self.assertTrue(result["success"])
+        self.assertEqual(sorted(task["id"] for task in result["tasks"]), ["TEST-TASK-001", "TEST-TASK-002"])
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-002", "exp_start_date")), "2023-12-07")
+
+    def test_shift_tasks_by_working_days(self):
+        """Scheduled open tasks move by working days; closed and unscheduled ones stay"""
+        # Unassigned, so dates move on the plain weekday calendar
+        self.create_extra_task("TEST-TASK-002", exp_start_date="2023-12-07", exp_end_date="2023-12-08")
+        self.create_extra_task("TEST-TASK-003", exp_start_date="2023-12-07", exp_end_date="2023-12-08", status="Cancelled")
+        self.create_extra_task("TEST-TASK-004")
+
+        result = ScheduleService.shift_tasks(2, task_ids=["TEST-TASK-002", "TEST-TASK-003", "TEST-TASK-004"])
+
+        self.assertTrue(result["success"])
+        self.assertEqual([task["id"] for task in result["tasks"]], ["TEST-TASK-002"])
+        # Thursday and Friday move over the weekend to Monday and Tuesday
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-002", "exp_start_date")), "2023-12-11")
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-002", "exp_end_date")), "2023-12-12")
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-003", "exp_start_date")), "2023-12-07")
+        self.assertIsNone(frappe.db.get_value("Task", "TEST-TASK-004", "exp_start_date"))
+
+        # An unknown department must not widen the shift to every task
+        with self.assertRaises(frappe.DoesNotExistError):
+            ScheduleService.shift_tasks(2, department="No Such Department")
+
+    def test_propagate_dependencies_pushes_successors(self):
+        """Successors are pushed past a moved predecessor, keeping their working-day length"""
+        successor = self.create_extra_task(
+            "TEST-TASK-002", exp_start_date="2023-12-04", exp_end_date="2023-12-05"
+        )
+        successor.append("depends_on", {"task": "TEST-TASK-001"})
+        successor.save()
+        frappe.db.commit()
+
+        TaskService.move_task("TEST-TASK-001", None, "2023-12-05", "2023-12-06")
+        result = ScheduleService.propagate_dependencies(["TEST-TASK-001"])
+
+        self.assertEqual([task["id"] for task in result["tasks"]], ["TEST-TASK-002"])
+        self.assertEqual(result["cycles"], [])
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-002", "exp_start_date")), "2023-12-07")
+        self.assertEqual(str(frappe.db.get_value("Task", "TEST-TASK-002", "exp_end_date")), "2023-12-08")
+
+        # Nothing downstream of the successor: nothing is written
+        self.assertEqual(
+            ScheduleService.propagate_dependencies(["TEST-TASK-002"]),
+            {"tasks": [], "cycles": [], "blocked_by": {}}
+        )
+
+    def test_bulk_format_matches_single(self):
+        """Batch formatter must produce the same dicts as format_task"""
+        rows = frappe.get_all(
+            "Task",
+            filters={"name": "TEST-TASK-001"},
+            fields=[
+                "name", "subject", "status", "priority", "project",
+                "exp_start_date", "exp_end_date", "expected_time",
+                "department", "description", "color", "type",
+                "_assign", "_comments", "creation", "modified"
+            ]
+        )
+        self.assertEqual(len(rows), 1)
+
+        expected = [TaskService.format_task(row) for row in rows]
+        self.assertEqual(TaskService.format_tasks(rows), expected)
+        self.assertEqual(expected[0]["assignee"], "test.employee@example.com")
+
+    def test_sync_pages_rows_sharing_modified(self):
+        """Delta sync must not skip rows written in the same instant across pages"""
+        dept_name = frappe.db.get_value("Department", {"department_name": "Test Department"})
+        self.create_extra_task("TEST-TASK-002")
+        self.create_extra_task("TEST-TASK-003")
+
+        modified = now_datetime().replace(microsecond=0) - timedelta(hours=1)
+        frappe.db.sql("""
+            UPDATE `tabTask` SET modified = %(modified)s WHERE name LIKE 'TEST-TASK-%%'
+        """, {"modified": modified})
+        frappe.db.commit()
+
+        watermark = sync.encode_watermark(modified - timedelta(seconds=1))
+        seen = []
+        with patch.object(sync, "CHANGES_PAGE_SIZE", 2):
+            first = sync.get_workload_changes(department=dept_name, since=watermark)
+            self.assertTrue(first["has_more"])
+            seen.extend(task["id"] for task in first["tasks"])
+
+            second = sync.get_workload_changes(department=dept_name, since=first["watermark"])
+            self.assertFalse(second["has_more"])
+            seen.extend(task["id"] for task in second["tasks"])
+
+        self.assertEqual(seen, ["TEST-TASK-001", "TEST-TASK-002", "TEST-TASK-003"])
+
     def tearDown(self):
         """Clean up test data after each test"""
         try:
@@ -263,6 +607,194 @@ class TestPlannerAPICritical(TestPlannerBase):
             frappe.log_error(f"Error in tearDown: {str(e)}")
             raise
 
+class TestPlannerAlgorithms(FrappeTestCase):
+    """Pure scheduling helpers that need no test records"""
+
+    def get_calendar(self):
+        # Monday 2024-01-01 anchor with a Wednesday holiday in the first week
+        anchor = date(2024, 1, 1)
+        return anchor, CalendarService.build_prefix(anchor, [date(2024, 1, 3)])
+
+    def test_build_prefix(self):
+        anchor, prefix = self.get_calendar()
+        self.assertEqual(len(prefix), (date(2031, 1, 1) - anchor).days + 1)
+        self.assertEqual(prefix[0], 0)
+        # Mon, Tue, Thu, Fri of the first week; the weekend adds nothing
+        self.assertEqual(prefix[5], 4)
+        self.assertEqual(prefix[7], 4)
+        self.assertEqual(prefix[8], 5)
+
+    def test_add_working_days(self):
+        with patch.object(CalendarService, "get_calendar", return_value=self.get_calendar()):
+            add = CalendarService.add_working_days
+            self.assertEqual(add(None, date(2024, 1, 2), 1), date(2024, 1, 4))
+            self.assertEqual(add(None, date(2024, 1, 6), 0), date(2024, 1, 8))
+            self.assertEqual(add(None, date(2024, 1, 7), 0, is_end=True), date(2024, 1, 5))
+            self.assertEqual(add(None, date(2024, 1, 5), -2, is_end=True), date(2024, 1, 2))
+
+            # Horizon edges fall back to weekday stepping
+            self.assertEqual(add(None, date(2030, 12, 31), 1), date(2031, 1, 1))
+            self.assertEqual(add(None, date(2030, 12, 31), 0, is_end=True), date(2030, 12, 31))
+            self.assertEqual(add(None, date(2023, 12, 29), 1), date(2024, 1, 1))
+            self.assertEqual(add(None, date(2024, 1, 1), -1), date(2023, 12, 29))
+
+    def get_interval_index(self):
+        return IntervalIndex([
+            ("2024-01-10", "2024-01-12", "C", 8),
+            ("2024-01-01", "2024-01-05", "A", 4),
+            ("2024-01-03", "2024-01-04", "B", 6),
+            ("2024-01-12", "2024-01-13", "D", 2),
+        ])
+
+    def test_interval_index_find_overlapping(self):
+        index = self.get_interval_index()
+        self.assertEqual(index.find_overlapping("2024-01-04", "2024-01-10"), ["A", "B", "C"])
+        self.assertEqual(index.find_overlapping("2024-01-04", "2024-01-10", exclude="B"), ["A", "C"])
+        # Inclusive end dates
+        self.assertEqual(index.find_overlapping("2024-01-05", "2024-01-05"), ["A"])
+        self.assertTrue(index.is_free("2024-01-06", "2024-01-09"))
+        self.assertEqual(IntervalIndex().find_overlapping("2024-01-01", "2024-01-31"), [])
+
+    def test_interval_index_pairs_and_overload(self):
+        index = self.get_interval_index()
+        self.assertEqual(index.overlapping_pairs(), [
+            {"task_a": "A", "task_b": "B", "start_date": date(2024, 1, 3), "end_date": date(2024, 1, 4)},
+            {"task_a": "C", "task_b": "D", "start_date": date(2024, 1, 12), "end_date": date(2024, 1, 12)},
+        ])
+        self.assertEqual(index.overload_windows(8), [
+            {"start_date": date(2024, 1, 3), "end_date": date(2024, 1, 4), "peak_hours": 10, "tasks": ["A", "B"]},
+            {"start_date": date(2024, 1, 12), "end_date": date(2024, 1, 12), "peak_hours": 10, "tasks": ["C", "D"]},
+        ])
+        self.assertEqual(index.overload_windows(10), [])
+
+    def test_overload_windows_skip_non_working_days(self):
+        """Load only counts on working days; a non-working day ends the window"""
+        # Friday to Monday at 10 hours per working day
+        index = IntervalIndex([("2024-01-05", "2024-01-08", "E", 10)])
+        self.assertEqual([(w["start_date"], w["end_date"]) for w in index.overload_windows(8)], [
+            (date(2024, 1, 5), date(2024, 1, 8)),
+        ])
+
+        weekdays = lambda day: day.weekday() < 5
+        self.assertEqual([(w["start_date"], w["end_date"]) for w in index.overload_windows(8, weekdays)], [
+            (date(2024, 1, 5), date(2024, 1, 5)),
+            (date(2024, 1, 8), date(2024, 1, 8)),
+        ])
+
+        # Monday on leave
+        on_leave = lambda day: weekdays(day) and day != date(2024, 1, 8)
+        self.assertEqual([(w["start_date"], w["end_date"]) for w in index.overload_windows(8, on_leave)], [
+            (date(2024, 1, 5), date(2024, 1, 5)),
+        ])
+
+    def test_dependency_graph_order_and_cycles(self):
+        graph = DependencyGraph([
+            ("a", "b"), ("b", "c"), ("a", "d"),
+            ("x", "y"), ("y", "x"), ("y", "z"),
+        ])
+        order, cyclic = graph.topological_order()
+        self.assertEqual(sorted(order), ["a", "b", "c", "d"])
+        self.assertLess(order.index("a"), order.index("b"))
+        self.assertLess(order.index("b"), order.index("c"))
+        self.assertLess(order.index("a"), order.index("d"))
+        # z is not on the cycle but waits behind it
+        self.assertEqual(cyclic, ["x", "y", "z"])
+
+        # Predecessors outside the requested nodes are ignored
+        self.assertEqual(graph.topological_order(["c", "b"]), (["b", "c"], []))
+
+    def test_dependency_graph_downstream(self):
+        graph = DependencyGraph([("a", "b"), ("b", "c"), ("a", "d"), ("x", "y"), ("y", "x")])
+        self.assertEqual(graph.downstream(["b"]), {"c"})
+        self.assertEqual(graph.downstream(["c"]), set())
+
+        order, cyclic = graph.downstream_order(["a"])
+        self.assertEqual(sorted(order), ["b", "c", "d"])
+        self.assertLess(order.index("b"), order.index("c"))
+        self.assertEqual(cyclic, [])
+
+        self.assertEqual(graph.downstream_order(["x"]), ([], ["x", "y"]))
+
+    def test_search_conditions(self):
+        """Search words are split into FULLTEXT terms and escaped LIKE patterns"""
+        self.assertEqual(TaskService.get_search_conditions(), ([], {}, "0"))
+
+        conditions, values, score = TaskService.get_search_conditions("design-api +v2", "PROJ_1%")
+        # Boolean-mode operators typed by the user are dropped with the punctuation
+        self.assertEqual(values["search"], "+design* +api*")
+        self.assertEqual(conditions[0], score)
+        self.assertIn("MATCH(subject, project, description)", score)
+        # Short words narrow the full-text matches anywhere in the subject
+        self.assertEqual(values["search_0"], "%v2%")
+        self.assertEqual(values["project"], "PROJ\\_1\\%%")
+        self.assertEqual(conditions[1:], ["subject LIKE %(search_0)s", "project LIKE %(project)s"])
+
+        # Only short words: a subject prefix match, no ranking
+        conditions, values, score = TaskService.get_search_conditions("x_")
+        self.assertEqual(conditions, ["subject LIKE %(search_0)s"])
+        self.assertEqual(values, {"search_0": "x\\_%"})
+        self.assertEqual(score, "0")
+
+    def test_plan_backlog(self):
+        placements, unplaced = ScheduleService.plan_backlog(
+            [
+                ("t1", 8, None),
+                ("t2", 8, None),   # tie on the first free day goes to the next employee in order
+                ("t3", 12, None),  # spills over into a second day
+                ("t4", 4, "e2"),   # preassigned
+                ("t5", 20, None),  # nobody has 20 hours left
+                ("t6", 4, "ghost"),
+                ("t7", 4, None),
+            ],
+            ["e1", "e2"],
+            [[8, 8, 8], [8, 8, 8]]
+        )
+        self.assertEqual(placements, [
+            ("t1", "e1", 0, 0),
+            ("t2", "e2", 0, 0),
+            ("t3", "e1", 1, 2),
+            ("t4", "e2", 1, 1),
+            ("t7", "e2", 1, 1),
+        ])
+        self.assertEqual(unplaced, ["t5", "t6"])
+        self.assertEqual(ScheduleService.plan_backlog([("t1", 8, None)], [], []), ([], ["t1"]))
+
+    def test_encode_tasks(self):
+        person = {"id": "a@example.com", "name": "A", "image": None}
+        tasks = [
+            {"id": "T1", "title": "One", "assignee": "a@example.com", "project": "P",
+             "status": "Open", "priority": "High", "startDate": "2024-01-03", "endDate": "2024-01-05",
+             "assignees": [person], "isOverdue": False},
+            {"id": "T2", "title": "Two", "assignee": "a@example.com", "project": None,
+             "status": "Open", "priority": "Low", "startDate": None, "endDate": None,
+             "assignees": [], "isOverdue": True},
+        ]
+        payload = encode_tasks(tasks)
+        self.assertEqual(payload["origin"], "2024-01-03")
+        self.assertEqual(payload["count"], 2)
+        self.assertEqual(payload["dictionaries"]["assignee"], ["a@example.com"])
+        self.assertEqual(payload["dictionaries"]["project"], ["P", None])
+        self.assertEqual(payload["dictionaries"]["status"], ["Open"])
+        self.assertEqual(payload["columns"]["assignee"], [0, 0])
+        self.assertEqual(payload["columns"]["priority"], [0, 1])
+        self.assertEqual(payload["columns"]["startDate"], [0, None])
+        self.assertEqual(payload["columns"]["endDate"], [2, None])
+        self.assertEqual(payload["columns"]["assignees"], [[0], []])
+        self.assertEqual(payload["columns"]["isOverdue"], [0, 1])
+        self.assertEqual(payload["people"], {"a@example.com": {"name": "A", "image": None}})
+
+        self.assertEqual(encode_tasks(tasks, origin="2024-01-01")["columns"]["startDate"], [2, None])
+        self.assertIsNone(encode_tasks([])["origin"])
+
+    def test_sync_watermark(self):
+        modified = now_datetime().replace(microsecond=0)
+        self.assertEqual(
+            sync.decode_watermark(sync.encode_watermark(modified, "TASK-0001")),
+            (modified, "TASK-0001")
+        )
+        # Plain timestamps from older clients start at that instant
+        self.assertEqual(sync.decode_watermark(str(modified)), (modified, ""))
+
 def run_critical_tests():
     """Run critical path tests"""
     import unittest
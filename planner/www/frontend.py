@@ -10,4 +10,6 @@ def get_context(context):
 	frappe.db.commit()
 	if frappe.session.user != "Guest":
 		capture("active_site", "planner")
-	context.csrf_token = csrf_token
\ No newline at end of file
+	context.csrf_token = csrf_token
+	context.site_name = frappe.local.site
+	context.socketio_port = frappe.conf.socketio_port
\ No newline at end of file
@@ -3,16 +3,29 @@ from frappe import _
 from frappe.utils import cint
 from ..services.task_service import TaskService
 from ..services.workload_service import WorkloadService
+from ..services.schedule_service import ScheduleService
+from ..services.workload_snapshot import WorkloadSnapshot
+from ..api import propagate_dependencies
 
 @frappe.whitelist()
 def list_tasks():
-    """List all tasks with optional filtering"""
+    """List tasks with optional filtering, paginated by cursor
+
+    ``total_count`` is the number of matching tasks, sent with the first page.
+    """
     try:
-        tasks = TaskService.get_all_tasks()
+        page = TaskService.get_tasks_page(
+            department=frappe.form_dict.get("department"),
+            start_date=frappe.form_dict.get("start_date"),
+            end_date=frappe.form_dict.get("end_date"),
+            cursor=frappe.form_dict.get("cursor"),
+            page_size=cint(frappe.form_dict.get("page_size"))
+        )
         return {
             "success": True,
-            "total_count": len(tasks),
-            "tasks": tasks
+            "total_count": page["total_count"],
+            "tasks": page["tasks"],
+            "next_cursor": page["next_cursor"]
         }
     except Exception as e:
         frappe.logger().error(f"Error listing tasks: {str(e)}")
@@ -20,7 +33,8 @@ def list_tasks():
             "success": False,
             "error": str(e),
             "total_count": 0,
-            "tasks": []
+            "tasks": [],
+            "next_cursor": None
         }
 
 @frappe.whitelist()
@@ -80,14 +94,15 @@ def batch_update_tasks():
         if not updates:
             frappe.throw(_("No updates provided"))
         
-        updated_tasks = TaskService.batch_update_tasks(
+        result = TaskService.bulk_update_tasks(
             updates,
             user=frappe.session.user
         )
         
         return {
-            "success": True,
-            "tasks": updated_tasks
+            "success": not result["failed"],
+            "tasks": result["updated"],
+            "failed": result["failed"]
         }
     except Exception as e:
         frappe.logger().error(f"Error in batch update: {str(e)}")
@@ -104,6 +119,7 @@ def move_task():
         assignee_id = frappe.form_dict.get("assignee_id")
         start_date = frappe.form_dict.get("start_date")
         end_date = frappe.form_dict.get("end_date")
+        modified = frappe.form_dict.get("modified")
         
         if not task_id:
             frappe.throw(_("Task ID is required"))
@@ -113,8 +129,12 @@ def move_task():
             assignee_id,
             start_date,
             end_date,
-            user=frappe.session.user
+            user=frappe.session.user,
+            modified=modified
         )
+        if result.get("success"):
+            # The move is committed; a propagation failure is reported, not raised
+            result["dependencies"] = propagate_dependencies([task_id])
         
         return {
             "success": True,
@@ -127,6 +147,75 @@ def move_task():
             "error": str(e)
         }
 
+@frappe.whitelist()
+def move_tasks():
+    """Move several tasks atomically (drag-select)"""
+    try:
+        moves = frappe.form_dict.get("moves")
+        if isinstance(moves, str):
+            moves = frappe.parse_json(moves)
+        
+        if not moves:
+            frappe.throw(_("Moves are required"))
+        
+        result = TaskService.move_tasks(moves, user=frappe.session.user)
+        if result.get("success"):
+            # The moves are committed; a propagation failure is reported, not raised
+            result["dependencies"] = propagate_dependencies([task["id"] for task in result["tasks"]])
+        
+        return result
+    except Exception as e:
+        frappe.logger().error(f"Error moving tasks: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@frappe.whitelist()
+def shift_schedule():
+    """Shift a project's scheduled tasks by N working days"""
+    try:
+        task_ids = frappe.form_dict.get("task_ids")
+        if isinstance(task_ids, str):
+            task_ids = frappe.parse_json(task_ids)
+        
+        return ScheduleService.shift_tasks(
+            frappe.form_dict.get("days"),
+            project=frappe.form_dict.get("project"),
+            department=frappe.form_dict.get("department"),
+            task_ids=task_ids,
+            user=frappe.session.user
+        )
+    except Exception as e:
+        frappe.logger().error(f"Error shifting schedule: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+@frappe.whitelist()
+def auto_schedule():
+    """Propose (or apply) placements of backlog tasks into free capacity"""
+    try:
+        task_ids = frappe.form_dict.get("task_ids")
+        if isinstance(task_ids, str):
+            task_ids = frappe.parse_json(task_ids)
+        
+        return ScheduleService.auto_schedule(
+            department=frappe.form_dict.get("department"),
+            start_date=frappe.form_dict.get("start_date"),
+            end_date=frappe.form_dict.get("end_date"),
+            task_ids=task_ids,
+            dry_run=cint(frappe.form_dict.get("dry_run", 1)),
+            user=frappe.session.user
+        )
+    except Exception as e:
+        frappe.logger().error(f"Error auto-scheduling backlog: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
 @frappe.whitelist()
 def get_workload():
     """Get workload data for planning"""
@@ -187,22 +276,9 @@ def get_planner_tasks():
         workload_data = WorkloadService.get_workload_data(department)
         
         # Convert to legacy format
-        employees_dict = {}
-        for assignee in workload_data["assignees"]:
-            assignee_tasks = [
-                task for task in workload_data["tasks"]
-                if task.get("assignee") == assignee["id"]
-            ]
-            
-            employees_dict[assignee["id"]] = {
-                "id": assignee["id"],
-                "name": assignee["name"],
-                "tasks": assignee_tasks
-            }
-        
         return {
             "success": True,
-            "data": list(employees_dict.values())
+            "data": WorkloadSnapshot(workload_data).to_legacy_planner_tasks()
         }
     except Exception as e:
         frappe.logger().error(f"Error getting planner tasks: {str(e)}")
@@ -214,45 +290,38 @@ def get_planner_tasks():
 
 @frappe.whitelist()
 def get_backlog():
-    """Get unscheduled tasks for backlog"""
+    """Get unscheduled tasks for backlog, ranked by the full-text search and paginated"""
     try:
         searchtext = frappe.form_dict.get("searchtext")
         project = frappe.form_dict.get("project")
+        start = cint(frappe.form_dict.get("start"))
+        page_length = cint(frappe.form_dict.get("page_length"))
         
-        filters = {
-            "status": ["in", ["Open", "Working"]],
-            "exp_start_date": ["is", "not set"]
-        }
+        conditions = ["status IN ('Open', 'Working')", "exp_start_date IS NULL"]
+        values = {}
         
-        if searchtext:
-            filters["subject"] = ["like", f"%{searchtext}%"]
+        search_conditions, search_values, score = TaskService.get_search_conditions(searchtext, project)
+        conditions.extend(search_conditions)
+        values.update(search_values)
         
-        if project:
-            filters["project"] = ["like", f"%{project}%"]
-        
-        tasks = frappe.get_all(
-            "Task",
-            filters=filters,
-            fields=[
+        tasks, has_more = TaskService.search_tasks(
+            [
                 "name", "subject", "status", "priority", "project",
                 "exp_start_date", "exp_end_date", "expected_time",
                 "department", "color", "_assign"
             ],
-            order_by="creation desc"
+            conditions,
+            values,
+            score=score,
+            start=start,
+            page_length=page_length
         )
         
-        formatted_tasks = []
-        for task in tasks:
-            try:
-                formatted_task = TaskService.format_task(task)
-                formatted_tasks.append(formatted_task)
-            except Exception as e:
-                frappe.logger().error(f"Error formatting task {task.name}: {str(e)}")
-                continue
-        
         return {
             "success": True,
-            "tasks": formatted_tasks
+            "tasks": TaskService.format_tasks(tasks),
+            "has_more": has_more,
+            "next_start": start + len(tasks) if has_more else None
         }
     except Exception as e:
         frappe.logger().error(f"Error getting backlog: {str(e)}")